@@ -5,46 +5,156 @@ Multi-Agent Coordination Script for Next.js Migration
 
 import json
 import asyncio
+import heapq
+import sys
+import time
 from datetime import datetime
 
 class AgentCoordinator:
-    def __init__(self):
+    def __init__(self, max_workers=4):
         with open("agents_config.json", "r") as f:
             self.agents = json.load(f)
-            
+        with open("tasks_config.json", "r") as f:
+            self.tasks = json.load(f)
+        self.max_workers = max_workers
+        self.validate_tasks()
+
+    def validate_tasks(self):
+        """Reject unknown agents, unknown dependencies and dependency cycles"""
+        for task_id, task in self.tasks.items():
+            if task["agent"] not in self.agents:
+                raise ValueError(f"Task {task_id} is owned by unknown agent {task['agent']}")
+            for dep in task.get("depends_on", []):
+                if dep not in self.tasks:
+                    raise ValueError(f"Task {task_id} depends on unknown task {dep}")
+
+        visiting, visited = set(), set()
+
+        def visit(task_id):
+            if task_id in visited:
+                return
+            if task_id in visiting:
+                raise ValueError(f"Dependency cycle detected at task {task_id}")
+            visiting.add(task_id)
+            for dep in self.tasks[task_id].get("depends_on", []):
+                visit(dep)
+            visiting.discard(task_id)
+            visited.add(task_id)
+
+        for task_id in self.tasks:
+            visit(task_id)
+
+    def task_priority(self, task_id):
+        """Lower runs first: explicit task priority, else the owning agent's"""
+        task = self.tasks[task_id]
+        return task.get("priority", self.agents[task["agent"]].get("priority", 99))
+
     async def coordinate_migration(self):
         print("🚀 Starting Next.js SDD migration with multi-agent coordination...")
-        
-        # Phase 1: Foundation
-        await self.execute_phase("foundation", [
-            "Initialize Next.js application",
-            "Set up SDD library structure", 
-            "Configure development environment"
-        ])
-        
-        # Phase 2: Core Libraries
-        await self.execute_phase("libraries", [
-            "Implement attendant-management library",
-            "Implement event-management library",
-            "Implement count-tracking library"
-        ])
-        
-        # Phase 3: API Layer
-        await self.execute_phase("api", [
-            "Create Next.js API routes",
-            "Set up Prisma database layer",
-            "Implement authentication"
-        ])
-        
+
+        dependents = {task_id: [] for task_id in self.tasks}
+        waiting_on = {}
+        for task_id, task in self.tasks.items():
+            waiting_on[task_id] = len(task.get("depends_on", []))
+            for dep in task.get("depends_on", []):
+                dependents[dep].append(task_id)
+
+        order = {task_id: position for position, task_id in enumerate(self.tasks)}
+        ready = [(self.task_priority(t), order[t], t) for t in self.tasks if waiting_on[t] == 0]
+        heapq.heapify(ready)
+
+        agent_busy = {agent: 0 for agent in self.agents}
+        agent_time = {agent: 0.0 for agent in self.agents}
+        running = {}
+        timings = {}
+        failed = set()
+        start = time.monotonic()
+
+        while ready or running:
+            # Start the highest-priority ready tasks whose agent has a free worker
+            deferred = []
+            while ready and len(running) < self.max_workers:
+                item = heapq.heappop(ready)
+                agent = self.tasks[item[2]]["agent"]
+                if agent_busy[agent] < self.agents[agent].get("workers", 1):
+                    agent_busy[agent] += 1
+                    running[asyncio.ensure_future(self.execute_task(item[2]))] = item[2]
+                else:
+                    deferred.append(item)
+            for item in deferred:
+                heapq.heappush(ready, item)
+
+            if not running:
+                break
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                task_id = running.pop(future)
+                agent = self.tasks[task_id]["agent"]
+                agent_busy[agent] -= 1
+                if future.exception():
+                    print(f"  ❌ {self.tasks[task_id]['description']}: {future.exception()}")
+                    failed.add(task_id)
+                    continue
+                started, finished = future.result()
+                timings[task_id] = (started - start, finished - start)
+                agent_time[agent] += finished - started
+                for dependent in dependents[task_id]:
+                    waiting_on[dependent] -= 1
+                    if waiting_on[dependent] == 0:
+                        heapq.heappush(ready, (self.task_priority(dependent), order[dependent], dependent))
+
+        skipped = set(self.tasks) - set(timings) - failed
+        for task_id in skipped:
+            print(f"  ⏭️  Skipped {self.tasks[task_id]['description']}: a dependency failed")
+
+        self.report(time.monotonic() - start, timings, agent_time)
+        if failed or skipped:
+            print(f"❌ Coordination finished with {len(failed)} failed and {len(skipped)} skipped tasks")
+            return False
+
         print("✅ Multi-agent coordination system ready!")
-        
-    async def execute_phase(self, phase_name, tasks):
-        print(f"📋 Executing {phase_name} phase...")
-        for task in tasks:
-            print(f"  ⏳ {task}")
-            await asyncio.sleep(0.1)  # Simulate work
-            print(f"  ✅ {task}")
+        return True
+
+    async def execute_task(self, task_id):
+        task = self.tasks[task_id]
+        started = time.monotonic()
+        print(f"  ⏳ [{task['phase']}] {task['description']} ({task['agent']})")
+        await asyncio.sleep(task.get("estimated_duration", 0.1))  # Simulate work
+        finished = time.monotonic()
+        print(f"  ✅ [{task['phase']}] {task['description']}")
+        return started, finished
+
+    def critical_path(self, timings):
+        """Longest dependency chain by measured task duration"""
+        longest = {}
+
+        def path_length(task_id):
+            if task_id not in longest:
+                started, finished = timings[task_id]
+                deps = [dep for dep in self.tasks[task_id].get("depends_on", []) if dep in timings]
+                best = max(deps, key=path_length, default=None)
+                chain = (longest[best][1] if best else []) + [task_id]
+                longest[task_id] = ((path_length(best) if best else 0.0) + finished - started, chain)
+            return longest[task_id][0]
+
+        if not timings:
+            return 0.0, []
+        end = max(timings, key=path_length)
+        return longest[end]
+
+    def report(self, wall_time, timings, agent_time):
+        length, chain = self.critical_path(timings)
+        print(f"📊 Run finished in {wall_time:.2f}s ({len(timings)}/{len(self.tasks)} tasks)")
+        print(f"   Critical path: {length:.2f}s across {len(chain)} tasks")
+        for task_id in chain:
+            print(f"     → {self.tasks[task_id]['description']}")
+        print("   Agent utilization:")
+        for agent, busy in sorted(agent_time.items(), key=lambda item: self.agents[item[0]].get("priority", 99)):
+            capacity = wall_time * self.agents[agent].get("workers", 1)
+            utilization = busy / capacity * 100 if capacity else 0.0
+            print(f"     {agent}: {utilization:.0f}% ({busy:.2f}s busy)")
 
 if __name__ == "__main__":
     coordinator = AgentCoordinator()
-    asyncio.run(coordinator.coordinate_migration())
+    sys.exit(0 if asyncio.run(coordinator.coordinate_migration()) else 1)
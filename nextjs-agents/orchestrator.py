@@ -5,23 +5,153 @@ Coordinates the migration from Django to Next.js using SDD principles
 """
 
 import asyncio
+import hashlib
+import inspect
 import json
-import subprocess
+import os
 import sys
+import time
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional
 
+class AsyncCommandRunner:
+    """Run a dependency graph of commands concurrently with streamed output"""
+
+    def __init__(self, max_concurrency: int = 4):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.results: Dict[str, Dict] = {}
+
+    async def run(self, commands: Dict[str, Dict]) -> Dict[str, Dict]:
+        """Execute commands keyed by name; each declares argv, cwd and depends_on"""
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def schedule(name: str) -> bool:
+            spec = commands[name]
+            dependencies = spec.get("depends_on", [])
+            if dependencies:
+                outcomes = await asyncio.gather(*(tasks[dep] for dep in dependencies))
+                if not all(outcomes):
+                    print(f"⏭️  Skipped {name}: a dependency failed")
+                    self.results[name] = {"status": "skipped", "duration": 0.0}
+                    return False
+            async with self.semaphore:
+                return await self.run_command(name, spec["argv"], spec["cwd"])
+
+        for name in commands:
+            tasks[name] = asyncio.ensure_future(schedule(name))
+        await asyncio.gather(*tasks.values())
+        return self.results
+
+    async def run_command(self, name: str, argv: List[str], cwd: Path) -> bool:
+        """Run one command, streaming its output line by line"""
+        print(f"▶️  Starting {name}: {' '.join(argv)}")
+        start = time.monotonic()
+        tail: List[str] = []
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *argv,
+                cwd=cwd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT
+            )
+            async for raw in process.stdout:
+                line = raw.decode(errors="replace").rstrip()
+                print(f"  [{name}] {line}")
+                tail = (tail + [line])[-20:]
+            returncode = await process.wait()
+        except Exception as e:
+            print(f"❌ Error running {name}: {e}")
+            self.results[name] = {"status": "error", "duration": time.monotonic() - start, "error": str(e)}
+            return False
+
+        duration = time.monotonic() - start
+        if returncode != 0:
+            print(f"⚠️  Command failed: {name} (exit {returncode}, {duration:.1f}s)")
+            self.results[name] = {"status": "failed", "duration": duration, "returncode": returncode, "output_tail": tail}
+            return False
+
+        print(f"✅ Completed: {name} ({duration:.1f}s)")
+        self.results[name] = {"status": "ok", "duration": duration, "returncode": 0}
+        return True
+
 class NextJSMigrationOrchestrator:
-    def __init__(self, project_root: str):
+    STATE_FILE = ".nextjs_migration_state.json"
+
+    def __init__(self, project_root: str, max_concurrency: int = 4, force: bool = False):
         self.project_root = Path(project_root)
+        self.max_concurrency = max_concurrency
+        self.force = force
         self.agents = {}
+        self.state_path = self.project_root / self.STATE_FILE
         self.migration_state = {
             "phase": "initialization",
             "completed_tasks": [],
             "active_tasks": [],
-            "failed_tasks": []
+            "failed_tasks": [],
+            "steps": {}
         }
+        self.load_state()
+        
+    def load_state(self):
+        """Restore step checkpoints from a previous run"""
+        if not self.state_path.is_file():
+            return
+        try:
+            with open(self.state_path, "r") as f:
+                self.migration_state.update(json.load(f))
+        except Exception as e:
+            print(f"⚠️  Ignoring unreadable migration state: {e}")
+            
+    def save_state(self):
+        """Persist migration state atomically"""
+        self.project_root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.migration_state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+        
+    def step_input_hash(self, step) -> str:
+        """Hash a step's inputs; every step's inputs are literals in its own source"""
+        digest = hashlib.sha256()
+        digest.update(str(self.project_root.resolve()).encode())
+        digest.update(inspect.getsource(step).encode())
+        return digest.hexdigest()
+        
+    async def run_step(self, step, outputs: List[str]) -> bool:
+        """Run a setup step unless its checkpoint matches and its outputs exist"""
+        name = step.__name__
+        input_hash = self.step_input_hash(step)
+        checkpoint = self.migration_state["steps"].get(name)
+        outputs_present = all((self.project_root / output).exists() for output in outputs)
+        
+        if not self.force and checkpoint and checkpoint["input_hash"] == input_hash and outputs_present:
+            print(f"⏭️  Skipping {name}: unchanged since {checkpoint['completed_at']}")
+            return True
+            
+        self.migration_state["phase"] = name
+        self.migration_state["active_tasks"] = [name]
+        self.save_state()
+        
+        start = time.monotonic()
+        succeeded = await step() is not False
+        
+        self.migration_state["active_tasks"] = []
+        for task_list in ("completed_tasks", "failed_tasks"):
+            if name in self.migration_state[task_list]:
+                self.migration_state[task_list].remove(name)
+        if succeeded:
+            self.migration_state["completed_tasks"].append(name)
+            self.migration_state["steps"][name] = {
+                "input_hash": input_hash,
+                "completed_at": datetime.now().isoformat(),
+                "duration": round(time.monotonic() - start, 2)
+            }
+        else:
+            self.migration_state["failed_tasks"].append(name)
+            self.migration_state["steps"].pop(name, None)
+        self.save_state()
+        return succeeded
         
     async def initialize_project_structure(self):
         """Initialize Next.js project with SDD structure"""
@@ -55,27 +185,39 @@ class NextJSMigrationOrchestrator:
         
         nextjs_path = self.project_root / "nextjs-app"
         
-        # Initialize Next.js with TypeScript
-        commands = [
-            f"cd {nextjs_path} && npx create-next-app@latest web --typescript --tailwind --eslint --app --src-dir --import-alias '@/*'",
-            f"cd {nextjs_path} && npm install prisma @prisma/client",
-            f"cd {nextjs_path} && npm install next-auth",
-            f"cd {nextjs_path} && npm install zod react-hook-form @hookform/resolvers",
-            f"cd {nextjs_path} && npm install zustand",
-            f"cd {nextjs_path} && npm install @testing-library/react @testing-library/jest-dom vitest",
-            f"cd {nextjs_path} && npx prisma init"
-        ]
+        # create-next-app installs into web/, so the shared dependency install
+        # in nextjs-app/ can run alongside it; the separate installs are merged
+        # into one npm invocation since npm serializes on package.json anyway
+        commands = {
+            "create-next-app": {
+                "argv": ["npx", "create-next-app@latest", "web", "--typescript", "--tailwind", "--eslint",
+                         "--app", "--src-dir", "--import-alias", "@/*"],
+                "cwd": nextjs_path
+            },
+            "install-dependencies": {
+                "argv": ["npm", "install",
+                         "prisma", "@prisma/client",
+                         "next-auth",
+                         "zod", "react-hook-form", "@hookform/resolvers",
+                         "zustand",
+                         "@testing-library/react", "@testing-library/jest-dom", "vitest"],
+                "cwd": nextjs_path
+            },
+            "prisma-init": {
+                "argv": ["npx", "prisma", "init"],
+                "cwd": nextjs_path,
+                "depends_on": ["install-dependencies"]
+            }
+        }
         
-        for cmd in commands:
-            try:
-                result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-                if result.returncode != 0:
-                    print(f"⚠️  Command failed: {cmd}")
-                    print(f"Error: {result.stderr}")
-                else:
-                    print(f"✅ Completed: {cmd.split('&&')[-1].strip()}")
-            except Exception as e:
-                print(f"❌ Error running command: {e}")
+        start = time.monotonic()
+        runner = AsyncCommandRunner(self.max_concurrency)
+        results = await runner.run(commands)
+        
+        print(f"⏱️  Next.js setup finished in {time.monotonic() - start:.1f}s")
+        for name, result in results.items():
+            print(f"   {name}: {result['status']} ({result['duration']:.1f}s)")
+        return all(result["status"] == "ok" for result in results.values())
                 
     async def create_sdd_libraries(self):
         """Create SDD library structure with contracts"""
@@ -108,6 +250,8 @@ class NextJSMigrationOrchestrator:
             }
         }
         
+        # Render everything in memory first so only changed files are written
+        rendered: Dict[Path, str] = {}
         for lib_name, lib_config in libraries.items():
             lib_path = self.project_root / "nextjs-app" / "libs" / lib_name
             
@@ -135,23 +279,49 @@ class NextJSMigrationOrchestrator:
                 }
             }
             
-            with open(lib_path / "package.json", "w") as f:
-                json.dump(package_json, f, indent=2)
+            rendered[lib_path / "package.json"] = json.dumps(package_json, indent=2)
                 
             # Create index.ts
-            with open(lib_path / "src" / "index.ts", "w") as f:
-                f.write(f'// {lib_config["description"]}\n\n')
-                for contract in lib_config["contracts"]:
-                    f.write(f'export * from "./{contract.lower()}";\n')
+            index_ts = f'// {lib_config["description"]}\n\n'
+            for contract in lib_config["contracts"]:
+                index_ts += f'export * from "./{contract.lower()}";\n'
+            rendered[lib_path / "src" / "index.ts"] = index_ts
                     
             # Create README
-            with open(lib_path / "README.md", "w") as f:
-                f.write(f"# {lib_name}\n\n{lib_config['description']}\n\n")
-                f.write("## Contracts\n\n")
-                for contract in lib_config["contracts"]:
-                    f.write(f"- `{contract}`\n")
-                    
-        print("✅ SDD libraries created")
+            readme = f"# {lib_name}\n\n{lib_config['description']}\n\n"
+            readme += "## Contracts\n\n"
+            for contract in lib_config["contracts"]:
+                readme += f"- `{contract}`\n"
+            rendered[lib_path / "README.md"] = readme
+            
+        summary = self.write_scaffold(rendered)
+        print(f"✅ SDD libraries: {len(summary['created'])} created, "
+              f"{len(summary['updated'])} updated, {len(summary['unchanged'])} unchanged")
+        for status in ("created", "updated"):
+            for path in summary[status]:
+                print(f"   {status}: {path.relative_to(self.project_root)}")
+        
+    def write_scaffold(self, rendered: Dict[Path, str]) -> Dict[str, List[Path]]:
+        """Write rendered files whose content differs from disk, atomically"""
+        summary = {"created": [], "updated": [], "unchanged": []}
+        for path, content in rendered.items():
+            data = content.encode()
+            if path.is_file():
+                # A size mismatch settles it without reading the file
+                if path.stat().st_size == len(data) and \
+                        hashlib.sha256(path.read_bytes()).digest() == hashlib.sha256(data).digest():
+                    summary["unchanged"].append(path)
+                    continue
+                status = "updated"
+            else:
+                status = "created"
+            
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f".{path.name}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+            summary[status].append(path)
+        return summary
         
     async def setup_multi_agent_system(self):
         """Initialize multi-agent coordination system"""
@@ -176,7 +346,8 @@ class NextJSMigrationOrchestrator:
             "library_dev": {
                 "role": "SDD library implementation",
                 "responsibilities": ["Core libraries", "Contract implementation", "Library testing"],
-                "priority": 2
+                "priority": 2,
+                "workers": 2
             },
             "devops": {
                 "role": "Build pipeline and deployment",
@@ -196,6 +367,76 @@ class NextJSMigrationOrchestrator:
         # Create agent configuration
         with open(agents_path / "agents_config.json", "w") as f:
             json.dump(agents_config, f, indent=2)
+
+        # Create task graph consumed by the coordinator's scheduler
+        tasks_config = {
+            "init-nextjs": {
+                "description": "Initialize Next.js application",
+                "phase": "foundation",
+                "agent": "devops",
+                "depends_on": [],
+                "estimated_duration": 0.1
+            },
+            "sdd-structure": {
+                "description": "Set up SDD library structure",
+                "phase": "foundation",
+                "agent": "lead_architect",
+                "depends_on": [],
+                "estimated_duration": 0.1
+            },
+            "dev-environment": {
+                "description": "Configure development environment",
+                "phase": "foundation",
+                "agent": "devops",
+                "depends_on": ["init-nextjs"],
+                "estimated_duration": 0.1
+            },
+            "lib-attendant-management": {
+                "description": "Implement attendant-management library",
+                "phase": "libraries",
+                "agent": "library_dev",
+                "depends_on": ["sdd-structure"],
+                "estimated_duration": 0.1
+            },
+            "lib-event-management": {
+                "description": "Implement event-management library",
+                "phase": "libraries",
+                "agent": "library_dev",
+                "depends_on": ["sdd-structure"],
+                "estimated_duration": 0.1
+            },
+            "lib-count-tracking": {
+                "description": "Implement count-tracking library",
+                "phase": "libraries",
+                "agent": "library_dev",
+                "depends_on": ["sdd-structure"],
+                "estimated_duration": 0.1
+            },
+            "api-routes": {
+                "description": "Create Next.js API routes",
+                "phase": "api",
+                "agent": "backend_api",
+                "depends_on": ["init-nextjs", "lib-attendant-management", "lib-event-management", "lib-count-tracking"],
+                "estimated_duration": 0.1
+            },
+            "prisma-layer": {
+                "description": "Set up Prisma database layer",
+                "phase": "api",
+                "agent": "backend_api",
+                "depends_on": ["init-nextjs"],
+                "estimated_duration": 0.1
+            },
+            "authentication": {
+                "description": "Implement authentication",
+                "phase": "api",
+                "agent": "backend_api",
+                "depends_on": ["api-routes", "prisma-layer"],
+                "estimated_duration": 0.1
+            }
+        }
+        
+        with open(agents_path / "tasks_config.json", "w") as f:
+            json.dump(tasks_config, f, indent=2)
             
         # Create coordination script
         coordination_script = '''#!/usr/bin/env python3
@@ -205,49 +446,159 @@ Multi-Agent Coordination Script for Next.js Migration
 
 import json
 import asyncio
+import heapq
+import sys
+import time
 from datetime import datetime
 
 class AgentCoordinator:
-    def __init__(self):
+    def __init__(self, max_workers=4):
         with open("agents_config.json", "r") as f:
             self.agents = json.load(f)
-            
+        with open("tasks_config.json", "r") as f:
+            self.tasks = json.load(f)
+        self.max_workers = max_workers
+        self.validate_tasks()
+
+    def validate_tasks(self):
+        """Reject unknown agents, unknown dependencies and dependency cycles"""
+        for task_id, task in self.tasks.items():
+            if task["agent"] not in self.agents:
+                raise ValueError(f"Task {task_id} is owned by unknown agent {task['agent']}")
+            for dep in task.get("depends_on", []):
+                if dep not in self.tasks:
+                    raise ValueError(f"Task {task_id} depends on unknown task {dep}")
+
+        visiting, visited = set(), set()
+
+        def visit(task_id):
+            if task_id in visited:
+                return
+            if task_id in visiting:
+                raise ValueError(f"Dependency cycle detected at task {task_id}")
+            visiting.add(task_id)
+            for dep in self.tasks[task_id].get("depends_on", []):
+                visit(dep)
+            visiting.discard(task_id)
+            visited.add(task_id)
+
+        for task_id in self.tasks:
+            visit(task_id)
+
+    def task_priority(self, task_id):
+        """Lower runs first: explicit task priority, else the owning agent's"""
+        task = self.tasks[task_id]
+        return task.get("priority", self.agents[task["agent"]].get("priority", 99))
+
     async def coordinate_migration(self):
         print("🚀 Starting Next.js SDD migration with multi-agent coordination...")
-        
-        # Phase 1: Foundation
-        await self.execute_phase("foundation", [
-            "Initialize Next.js application",
-            "Set up SDD library structure", 
-            "Configure development environment"
-        ])
-        
-        # Phase 2: Core Libraries
-        await self.execute_phase("libraries", [
-            "Implement attendant-management library",
-            "Implement event-management library",
-            "Implement count-tracking library"
-        ])
-        
-        # Phase 3: API Layer
-        await self.execute_phase("api", [
-            "Create Next.js API routes",
-            "Set up Prisma database layer",
-            "Implement authentication"
-        ])
-        
+
+        dependents = {task_id: [] for task_id in self.tasks}
+        waiting_on = {}
+        for task_id, task in self.tasks.items():
+            waiting_on[task_id] = len(task.get("depends_on", []))
+            for dep in task.get("depends_on", []):
+                dependents[dep].append(task_id)
+
+        order = {task_id: position for position, task_id in enumerate(self.tasks)}
+        ready = [(self.task_priority(t), order[t], t) for t in self.tasks if waiting_on[t] == 0]
+        heapq.heapify(ready)
+
+        agent_busy = {agent: 0 for agent in self.agents}
+        agent_time = {agent: 0.0 for agent in self.agents}
+        running = {}
+        timings = {}
+        failed = set()
+        start = time.monotonic()
+
+        while ready or running:
+            # Start the highest-priority ready tasks whose agent has a free worker
+            deferred = []
+            while ready and len(running) < self.max_workers:
+                item = heapq.heappop(ready)
+                agent = self.tasks[item[2]]["agent"]
+                if agent_busy[agent] < self.agents[agent].get("workers", 1):
+                    agent_busy[agent] += 1
+                    running[asyncio.ensure_future(self.execute_task(item[2]))] = item[2]
+                else:
+                    deferred.append(item)
+            for item in deferred:
+                heapq.heappush(ready, item)
+
+            if not running:
+                break
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                task_id = running.pop(future)
+                agent = self.tasks[task_id]["agent"]
+                agent_busy[agent] -= 1
+                if future.exception():
+                    print(f"  ❌ {self.tasks[task_id]['description']}: {future.exception()}")
+                    failed.add(task_id)
+                    continue
+                started, finished = future.result()
+                timings[task_id] = (started - start, finished - start)
+                agent_time[agent] += finished - started
+                for dependent in dependents[task_id]:
+                    waiting_on[dependent] -= 1
+                    if waiting_on[dependent] == 0:
+                        heapq.heappush(ready, (self.task_priority(dependent), order[dependent], dependent))
+
+        skipped = set(self.tasks) - set(timings) - failed
+        for task_id in skipped:
+            print(f"  ⏭️  Skipped {self.tasks[task_id]['description']}: a dependency failed")
+
+        self.report(time.monotonic() - start, timings, agent_time)
+        if failed or skipped:
+            print(f"❌ Coordination finished with {len(failed)} failed and {len(skipped)} skipped tasks")
+            return False
+
         print("✅ Multi-agent coordination system ready!")
-        
-    async def execute_phase(self, phase_name, tasks):
-        print(f"📋 Executing {phase_name} phase...")
-        for task in tasks:
-            print(f"  ⏳ {task}")
-            await asyncio.sleep(0.1)  # Simulate work
-            print(f"  ✅ {task}")
+        return True
+
+    async def execute_task(self, task_id):
+        task = self.tasks[task_id]
+        started = time.monotonic()
+        print(f"  ⏳ [{task['phase']}] {task['description']} ({task['agent']})")
+        await asyncio.sleep(task.get("estimated_duration", 0.1))  # Simulate work
+        finished = time.monotonic()
+        print(f"  ✅ [{task['phase']}] {task['description']}")
+        return started, finished
+
+    def critical_path(self, timings):
+        """Longest dependency chain by measured task duration"""
+        longest = {}
+
+        def path_length(task_id):
+            if task_id not in longest:
+                started, finished = timings[task_id]
+                deps = [dep for dep in self.tasks[task_id].get("depends_on", []) if dep in timings]
+                best = max(deps, key=path_length, default=None)
+                chain = (longest[best][1] if best else []) + [task_id]
+                longest[task_id] = ((path_length(best) if best else 0.0) + finished - started, chain)
+            return longest[task_id][0]
+
+        if not timings:
+            return 0.0, []
+        end = max(timings, key=path_length)
+        return longest[end]
+
+    def report(self, wall_time, timings, agent_time):
+        length, chain = self.critical_path(timings)
+        print(f"📊 Run finished in {wall_time:.2f}s ({len(timings)}/{len(self.tasks)} tasks)")
+        print(f"   Critical path: {length:.2f}s across {len(chain)} tasks")
+        for task_id in chain:
+            print(f"     → {self.tasks[task_id]['description']}")
+        print("   Agent utilization:")
+        for agent, busy in sorted(agent_time.items(), key=lambda item: self.agents[item[0]].get("priority", 99)):
+            capacity = wall_time * self.agents[agent].get("workers", 1)
+            utilization = busy / capacity * 100 if capacity else 0.0
+            print(f"     {agent}: {utilization:.0f}% ({busy:.2f}s busy)")
 
 if __name__ == "__main__":
     coordinator = AgentCoordinator()
-    asyncio.run(coordinator.coordinate_migration())
+    sys.exit(0 if asyncio.run(coordinator.coordinate_migration()) else 1)
 '''
         
         with open(agents_path / "coordinate.py", "w") as f:
@@ -355,12 +706,23 @@ if __name__ == "__main__":
         print("🚀 Starting Next.js SDD Migration Setup...")
         print(f"📁 Project root: {self.project_root}")
         
+        # Each step is skipped on rerun when its inputs are unchanged and
+        # the listed outputs still exist
+        steps = [
+            (self.initialize_project_structure, ["nextjs-app"]),
+            (self.setup_nextjs_application, ["nextjs-app/web/package.json", "nextjs-app/node_modules", "nextjs-app/prisma"]),
+            (self.create_sdd_libraries, ["nextjs-app/libs"]),
+            (self.setup_multi_agent_system, ["nextjs-agents/coordinate.py", "nextjs-agents/agents_config.json", "nextjs-agents/tasks_config.json"]),
+            (self.create_migration_plan, ["NEXTJS_MIGRATION_PLAN.json"])
+        ]
+        
         try:
-            await self.initialize_project_structure()
-            await self.setup_nextjs_application()
-            await self.create_sdd_libraries()
-            await self.setup_multi_agent_system()
-            await self.create_migration_plan()
+            for step, outputs in steps:
+                await self.run_step(step, outputs)
+            
+            if self.migration_state["failed_tasks"]:
+                print(f"\n❌ Setup incomplete, steps to retry on next run: {', '.join(self.migration_state['failed_tasks'])}")
+                return False
             
             print("\n🎉 Next.js SDD Migration Setup Complete!")
             print("\n📋 Next Steps:")
@@ -376,12 +738,13 @@ if __name__ == "__main__":
         return True
 
 async def main():
-    if len(sys.argv) != 2:
-        print("Usage: python orchestrator.py <project_root>")
+    args = [arg for arg in sys.argv[1:] if arg != "--force"]
+    if len(args) != 1:
+        print("Usage: python orchestrator.py <project_root> [--force]")
         sys.exit(1)
         
-    project_root = sys.argv[1]
-    orchestrator = NextJSMigrationOrchestrator(project_root)
+    project_root = args[0]
+    orchestrator = NextJSMigrationOrchestrator(project_root, force="--force" in sys.argv[1:])
     
     success = await orchestrator.run_migration_setup()
     sys.exit(0 if success else 1)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Local release artifact cache for MCP deployments
+Artifacts are streamed, hashed and extracted in a single pass and kept as
+extracted trees keyed by commit SHA, with LRU eviction by disk budget
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+DEFAULT_CACHE_DIR = os.path.expanduser("~/.cache/mcp-deploy/artifacts")
+DEFAULT_BUDGET_BYTES = 5 * 1024 ** 3
+MANIFEST_NAME = ".artifact.json"
+
+_commit_locks: Dict[str, threading.Lock] = {}
+_commit_locks_lock = threading.Lock()
+
+class ChecksumMismatch(Exception):
+    pass
+
+class HashingReader:
+    """File-like wrapper that hashes and counts bytes as they are read"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.digest = hashlib.sha256()
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.stream.read(size)
+        self.digest.update(chunk)
+        self.bytes_read += len(chunk)
+        return chunk
+
+    def drain(self, chunk_size: int = 1024 * 1024):
+        """Consume trailing bytes (tar padding) so the digest covers the whole artifact"""
+        while self.read(chunk_size):
+            pass
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Surface redirects as HTTPError so the caller decides which headers follow"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+def open_artifact(url: str, headers: Optional[Dict[str, str]] = None):
+    """Open an artifact URL, keeping credentials off redirects
+    The API answers with a redirect to a pre-signed storage URL; urllib would
+    copy the Authorization header there, so the signed URL is fetched without it"""
+    headers = headers or {}
+    try:
+        return urllib.request.build_opener(NoRedirect).open(urllib.request.Request(url, headers=headers))
+    except urllib.error.HTTPError as e:
+        location = e.headers.get("Location")
+        if e.code not in (301, 302, 303, 307, 308) or not location:
+            raise
+        e.close()
+    unauthenticated = {name: value for name, value in headers.items() if name.lower() != "authorization"}
+    return urllib.request.urlopen(urllib.request.Request(urllib.parse.urljoin(url, location), headers=unauthenticated))
+
+class ArtifactCache:
+    def __init__(self, root: Optional[str] = None, budget_bytes: Optional[int] = None):
+        self.root = root or os.environ.get("MCP_ARTIFACT_CACHE", DEFAULT_CACHE_DIR)
+        self.budget_bytes = budget_bytes or int(os.environ.get("MCP_ARTIFACT_CACHE_BYTES", DEFAULT_BUDGET_BYTES))
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, commit_sha: str) -> str:
+        return os.path.join(self.root, commit_sha)
+
+    def read_manifest(self, commit_sha: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.path(commit_sha), MANIFEST_NAME)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write_manifest(self, directory: str, manifest: Dict[str, Any]):
+        # Fleet nodes share the cache, so concurrent writers each get their own temp file
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{MANIFEST_NAME}.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp_path, os.path.join(directory, MANIFEST_NAME))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    @contextmanager
+    def commit_lock(self, commit_sha: str):
+        """Serialize fetches of one commit across threads and processes"""
+        with _commit_locks_lock:
+            thread_lock = _commit_locks.setdefault(commit_sha, threading.Lock())
+        with thread_lock, open(os.path.join(self.root, f".{commit_sha}.lock"), "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def get(self, commit_sha: str) -> Optional[str]:
+        """Return the cached tree for a commit, marking it recently used"""
+        manifest = self.read_manifest(commit_sha)
+        if manifest is None:
+            return None
+        manifest["last_used"] = time.time()
+        self.write_manifest(self.path(commit_sha), manifest)
+        return self.path(commit_sha)
+
+    def fetch(self, commit_sha: str, url: str, expected_sha256: Optional[str] = None,
+              headers: Optional[Dict[str, str]] = None) -> str:
+        """Stream a .tar.gz artifact into the cache, verifying its checksum"""
+        cached = self.get(commit_sha)
+        if cached:
+            return cached
+
+        with self.commit_lock(commit_sha):
+            # Another node may have fetched it while this one waited
+            cached = self.get(commit_sha)
+            if cached:
+                return cached
+            self.download(commit_sha, url, expected_sha256, headers)
+
+        self.evict(keep=[commit_sha])
+        return self.path(commit_sha)
+
+    def download(self, commit_sha: str, url: str, expected_sha256: Optional[str],
+                 headers: Optional[Dict[str, str]]):
+        staging = tempfile.mkdtemp(prefix=f".{commit_sha}.", suffix=".partial", dir=self.root)
+        try:
+            with open_artifact(url, headers) as response:
+                reader = HashingReader(response)
+                # Stream mode never seeks, so nothing is buffered to disk first
+                with tarfile.open(fileobj=reader, mode="r|gz") as archive:
+                    if hasattr(tarfile, "data_filter"):
+                        archive.extractall(staging, filter="data")
+                    else:
+                        archive.extractall(staging)
+                reader.drain()
+
+            digest = reader.digest.hexdigest()
+            if expected_sha256 and digest != expected_sha256.lower().replace("sha256:", ""):
+                raise ChecksumMismatch(f"Artifact checksum mismatch for {commit_sha}: got {digest}, expected {expected_sha256}")
+
+            now = time.time()
+            self.write_manifest(staging, {
+                "commit_sha": commit_sha,
+                "artifact_sha256": digest,
+                "artifact_bytes": reader.bytes_read,
+                "size": self.tree_size(staging),
+                "fetched_at": now,
+                "last_used": now
+            })
+            if os.path.isdir(self.path(commit_sha)):
+                # A tree without a readable manifest is left over from an interrupted run
+                shutil.rmtree(self.path(commit_sha))
+            os.rename(staging, self.path(commit_sha))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+    def tree_size(self, directory: str) -> int:
+        total = 0
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in filenames:
+                try:
+                    total += os.lstat(os.path.join(dirpath, filename)).st_size
+                except OSError:
+                    pass
+        return total
+
+    def entries(self) -> List[Dict[str, Any]]:
+        manifests = []
+        for name in os.listdir(self.root):
+            if name.startswith("."):
+                continue
+            manifest = self.read_manifest(name)
+            if manifest:
+                manifests.append(manifest)
+        return manifests
+
+    def evict(self, keep: Optional[List[str]] = None) -> List[str]:
+        """Remove least recently used trees until the cache fits its budget"""
+        keep = set(keep or [])
+        entries = sorted(self.entries(), key=lambda m: m.get("last_used", 0))
+        total = sum(m.get("size", 0) for m in entries)
+        evicted = []
+        for manifest in entries:
+            if total <= self.budget_bytes:
+                break
+            if manifest["commit_sha"] in keep:
+                continue
+            shutil.rmtree(self.path(manifest["commit_sha"]), ignore_errors=True)
+            total -= manifest.get("size", 0)
+            evicted.append(manifest["commit_sha"])
+        return evicted
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Fleet waves shared by the deploy and rollback orchestrators
+Runs one action per container: the canary (first target) goes alone, and
+the rest follow concurrently up to max-in-flight only if the canary passed
+"""
+
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Tuple
+
+Target = Tuple[str, Optional[str]]
+
+def parse_targets(spec: str) -> List[Target]:
+    """Parse "132=http://10.92.3.132:3001,134" into (container_id, app_url) pairs
+    Nodes without an explicit URL take MCP_FLEET_APP_URL with {container_id}
+    filled in; each node of a fleet must end up with its own URL"""
+    template = os.environ.get("MCP_FLEET_APP_URL")
+    targets = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        container_id, _, app_url = item.partition("=")
+        if not app_url and template:
+            app_url = template.format(container_id=container_id)
+        targets.append((container_id, app_url or None))
+    if len(targets) > 1:
+        missing = [container_id for container_id, app_url in targets if not app_url]
+        if missing:
+            raise ValueError(f"No app URL for container(s) {', '.join(missing)}: give <id>=<url> "
+                             "or set MCP_FLEET_APP_URL (e.g. http://10.92.3.{container_id}:3001)")
+        urls = [app_url for _, app_url in targets]
+        if len(set(urls)) != len(urls):
+            raise ValueError("Every container in a fleet needs its own app URL")
+    return targets
+
+def is_fleet(spec: str) -> bool:
+    return "," in spec or "=" in spec
+
+async def run_wave(targets: List[Target], action: Callable[[str, Optional[str]], Awaitable[bool]],
+                   max_in_flight: int = 2) -> Dict[str, Any]:
+    """Run the action on the canary, then on the remaining nodes concurrently"""
+    start = time.monotonic()
+    nodes: Dict[str, Dict[str, Any]] = {}
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def run_node(container_id: str, app_url: Optional[str]):
+        async with semaphore:
+            node_start = time.monotonic()
+            node = nodes[container_id] = {"app_url": app_url, "success": False, "error": None}
+            try:
+                node["success"] = bool(await action(container_id, app_url))
+            except Exception as e:
+                node["error"] = str(e)
+            node["duration"] = time.monotonic() - node_start
+
+    canary_id, canary_url = targets[0]
+    print(f"🐤 Canary: container {canary_id}")
+    await run_node(canary_id, canary_url)
+    aborted = not nodes[canary_id]["success"]
+
+    if aborted:
+        print(f"❌ Canary {canary_id} failed, aborting the wave")
+        for container_id, app_url in targets[1:]:
+            nodes[container_id] = {"app_url": app_url, "success": False, "error": "skipped: canary failed", "duration": 0.0}
+    elif len(targets) > 1:
+        print(f"🌊 Rolling out to {len(targets) - 1} more container(s), {max_in_flight} in flight")
+        await asyncio.gather(*(run_node(container_id, app_url) for container_id, app_url in targets[1:]))
+
+    return {
+        "success": all(node["success"] for node in nodes.values()),
+        "aborted": aborted,
+        "canary": canary_id,
+        "duration": time.monotonic() - start,
+        "nodes": nodes
+    }
+
+def report(result: Dict[str, Any]):
+    print(f"📊 Fleet summary ({result['duration']:.1f}s):")
+    for container_id, node in result["nodes"].items():
+        status = "✅" if node["success"] else "❌"
+        role = " (canary)" if container_id == result["canary"] else ""
+        print(f"   {status} {container_id}{role}: {node['duration']:.1f}s"
+              + (f" - {node['error']}" if node["error"] else ""))
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+HTTP health-check probe engine shared by the deploy and rollback orchestrators
+Polls every configured endpoint concurrently with exponential backoff and
+jitter, and passes as soon as each endpoint answers N consecutive probes
+"""
+
+import asyncio
+import os
+import random
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import Dict, Any, List, Optional
+
+DEFAULT_ENDPOINTS = ["/api/health"]
+
+def configured_app_url(base_url: Optional[str] = None) -> str:
+    """The app URL to probe: an explicit one (one fleet node), else MCP_APP_URL
+    There is no localhost default: the scripts run on the orchestrator host,
+    not in the container, so guessing would probe the wrong machine"""
+    base_url = base_url or os.environ.get("MCP_APP_URL")
+    if not base_url:
+        raise ValueError("No app URL configured: set MCP_APP_URL "
+                         "or give <container_id>=<app_url>")
+    return base_url.rstrip("/")
+
+def configured_health_urls(base_url: Optional[str] = None) -> List[str]:
+    """Health URLs from MCP_HEALTH_URLS, else the default endpoints on the app URL
+    An explicit base_url (one fleet node) re-targets MCP_HEALTH_URLS at that host"""
+    urls = os.environ.get("MCP_HEALTH_URLS")
+    if urls:
+        urls = [url.strip() for url in urls.split(",") if url.strip()]
+        if base_url:
+            base = urllib.parse.urlsplit(base_url)
+            urls = [urllib.parse.urlunsplit(urllib.parse.urlsplit(url)._replace(scheme=base.scheme, netloc=base.netloc))
+                    for url in urls]
+        return urls
+    base_url = configured_app_url(base_url)
+    return [f"{base_url}{endpoint}" for endpoint in DEFAULT_ENDPOINTS]
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-int(pct * len(ordered)) // 100))
+    return ordered[min(rank, len(ordered)) - 1]
+
+class HealthProbeEngine:
+    def __init__(self, urls: List[str], required_successes: int = 3, timeout: float = 60,
+                 request_timeout: float = 5, interval: float = 0.25, max_backoff: float = 5.0):
+        self.urls = urls
+        self.required_successes = required_successes
+        self.timeout = timeout
+        self.request_timeout = request_timeout
+        self.interval = interval
+        self.max_backoff = max_backoff
+
+    def probe_once(self, url: str):
+        """Issue one GET; returns (ok, latency_seconds, error)"""
+        start = time.monotonic()
+        try:
+            with urllib.request.urlopen(url, timeout=self.request_timeout) as response:
+                response.read()
+                ok = 200 <= response.status < 300
+                return ok, time.monotonic() - start, None if ok else f"HTTP {response.status}"
+        except urllib.error.HTTPError as e:
+            return False, time.monotonic() - start, f"HTTP {e.code}"
+        except Exception as e:
+            return False, time.monotonic() - start, str(e)
+
+    async def probe_endpoint(self, url: str, stats: Dict[str, Any]):
+        """Probe one endpoint until it passes N times in a row"""
+        consecutive = 0
+        failures_in_a_row = 0
+        while consecutive < self.required_successes:
+            ok, latency, error = await asyncio.to_thread(self.probe_once, url)
+            stats["attempts"] += 1
+            stats["latencies"].append(latency)
+            if ok:
+                consecutive += 1
+                failures_in_a_row = 0
+                delay = self.interval
+            else:
+                consecutive = 0
+                failures_in_a_row += 1
+                stats["failures"] += 1
+                stats["last_error"] = error
+                backoff = min(self.max_backoff, self.interval * 2 ** failures_in_a_row)
+                delay = backoff * random.uniform(0.5, 1.5)
+            if consecutive < self.required_successes:
+                await asyncio.sleep(delay)
+        stats["passed"] = True
+
+    async def run(self) -> Dict[str, Any]:
+        """Probe all endpoints concurrently within the timeout budget"""
+        start = time.monotonic()
+        stats = {url: {"passed": False, "attempts": 0, "failures": 0, "last_error": None, "latencies": []}
+                 for url in self.urls}
+        tasks = [asyncio.ensure_future(self.probe_endpoint(url, stats[url])) for url in self.urls]
+        _, pending = await asyncio.wait(tasks, timeout=self.timeout)
+        for task in pending:
+            task.cancel()
+
+        probes = {}
+        for url, probe in stats.items():
+            latencies = probe.pop("latencies")
+            probe["latency_ms"] = {
+                "p50": round(percentile(latencies, 50) * 1000, 1),
+                "p95": round(percentile(latencies, 95) * 1000, 1),
+                "max": round(max(latencies, default=0) * 1000, 1)
+            }
+            probes[url] = probe
+
+        return {
+            "healthy": all(probe["passed"] for probe in probes.values()),
+            "duration": time.monotonic() - start,
+            "probes": probes
+        }
+
+    def report(self, result: Dict[str, Any]):
+        for url, probe in result["probes"].items():
+            status = "✅" if probe["passed"] else "❌"
+            latency = probe["latency_ms"]
+            print(f"   {status} {url}: {probe['attempts']} probes, {probe['failures']} failed, "
+                  f"p50 {latency['p50']}ms p95 {latency['p95']}ms"
+                  + (f" (last error: {probe['last_error']})" if not probe["passed"] and probe["last_error"] else ""))
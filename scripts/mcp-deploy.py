@@ -4,71 +4,62 @@ MCP-Powered Deployment Script
 Orchestrates deployments using Proxmox and GitHub MCPs for immutable, rollback-safe deployments
 """
 
+import asyncio
+import hashlib
 import json
-import subprocess
+import re
 import sys
 import time
 import os
-from pathlib import Path
-from typing import Dict, Any, Optional
+import urllib.parse
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Tuple
+
+from artifact_cache import ArtifactCache, MANIFEST_NAME
+from fleet import is_fleet, parse_targets, report as report_fleet, run_wave
+from health_probe import HealthProbeEngine, configured_app_url, configured_health_urls
+from mcp_client import get_mcp_client
+from release_index import ReleaseIndex, seed_from_container
+from release_switch import ReleaseSwitcher, configured_front_url
+from release_warmup import configured_warmup_urls, warm_up_release
+from snapshot_manager import SnapshotManager
 
 class MCPDeploymentOrchestrator:
-    def __init__(self, project_name: str, container_id: str, node: str = "proxmox"):
+    def __init__(self, project_name: str, container_id: str, node: str = "proxmox",
+                 restart_mode: Optional[str] = None, app_url: Optional[str] = None):
         self.project_name = project_name
         self.container_id = container_id
         self.node = node
         self.github_mcp_path = "/Users/cory/Documents/Cloudy-Work/homelab/mcp-server-github/dist/index.js"
         self.proxmox_mcp_path = "/Users/cory/Documents/Cloudy-Work/homelab/mcp-server-proxmox/dist/index.js"
+        # Long-lived sessions shared with the rollback orchestrator
+        self.github_mcp = get_mcp_client(self.github_mcp_path, "GitHub")
+        self.proxmox_mcp = get_mcp_client(self.proxmox_mcp_path, "Proxmox")
+        # Optional JSON Lines sink for per-stage timing events
+        self.events_file = os.environ.get("MCP_DEPLOY_EVENTS_FILE")
+        self.events: List[Dict[str, Any]] = []
+        self.artifact_cache = ArtifactCache()
+        self.release_index = ReleaseIndex(project_name, container_id)
+        self.snapshots = SnapshotManager(self.proxmox_mcp, node, project_name, container_id)
+        # Per-node app URL in fleet mode; defaults to MCP_APP_URL
+        self.app_url = app_url
+        # Fail before touching the container when there is nothing to probe
+        configured_health_urls(app_url)
+        configured_warmup_urls(app_url)
+        # Releases are pushed with rsync from this host, where the artifact
+        # cache lives, into the container over SSH
+        ssh_target = os.environ.get("MCP_SSH_TARGET")
+        self.ssh_target = (ssh_target.format(container_id=container_id) if ssh_target
+                           else f"root@{urllib.parse.urlsplit(configured_app_url(app_url)).hostname}")
+        self.switcher = ReleaseSwitcher(project_name, self.run_remote, self.release_index, restart_mode,
+                                        app_url=app_url, front_url=configured_front_url(container_id))
         
     def call_github_mcp(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
         """Call GitHub MCP with specified method and parameters"""
-        request = {
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": f"tools/call",
-            "params": {
-                "name": method,
-                "arguments": params
-            }
-        }
-        
-        result = subprocess.run(
-            ["node", self.github_mcp_path],
-            input=json.dumps(request),
-            text=True,
-            capture_output=True,
-            cwd=Path(self.github_mcp_path).parent
-        )
-        
-        if result.returncode != 0:
-            raise Exception(f"GitHub MCP call failed: {result.stderr}")
-            
-        return json.loads(result.stdout.split('\n')[1])  # Skip the "GitHub MCP server running" line
+        return self.github_mcp.call_tool(method, params)
     
     def call_proxmox_mcp(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
         """Call Proxmox MCP with specified method and parameters"""
-        request = {
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": f"tools/call",
-            "params": {
-                "name": method,
-                "arguments": params
-            }
-        }
-        
-        result = subprocess.run(
-            ["node", self.proxmox_mcp_path],
-            input=json.dumps(request),
-            text=True,
-            capture_output=True,
-            cwd=Path(self.proxmox_mcp_path).parent
-        )
-        
-        if result.returncode != 0:
-            raise Exception(f"Proxmox MCP call failed: {result.stderr}")
-            
-        return json.loads(result.stdout.split('\n')[1])  # Skip the "Proxmox MCP server running" line
+        return self.proxmox_mcp.call_tool(method, params)
 
     def get_latest_commit_sha(self, owner: str, repo: str, branch: str = "main") -> str:
         """Get the latest commit SHA for deployment tracking"""
@@ -87,129 +78,337 @@ class MCPDeploymentOrchestrator:
         print(f"✅ Latest commit SHA: {sha}")
         return sha
 
-    def download_release_artifact(self, owner: str, repo: str, run_id: str) -> str:
-        """Download the latest release artifact from GitHub Actions"""
+    def download_release_artifact(self, owner: str, repo: str, run_id: str, commit_sha: str) -> str:
+        """Fetch the release artifact for a commit into the local cache, extracted"""
+        cached = self.artifact_cache.get(commit_sha)
+        if cached:
+            print(f"📦 Using cached artifact for {commit_sha}: {cached}")
+            return cached
+        
         print(f"📦 Downloading release artifact for {owner}/{repo} run {run_id}")
+        response = self.call_github_mcp("get_release_artifact", {
+            "owner": owner,
+            "repo": repo,
+            "run_id": run_id
+        })
         
-        # In a real implementation, this would download and extract the artifact
-        # For now, we'll simulate with the existing deployment approach
-        artifact_path = f"/tmp/{repo}-{run_id}.tar.gz"
-        print(f"✅ Artifact downloaded to: {artifact_path}")
-        return artifact_path
+        if "error" in response:
+            raise Exception(f"Failed to resolve release artifact: {response['error']}")
+        
+        artifact = response["result"]
+        headers = {}
+        if os.environ.get("GITHUB_TOKEN"):
+            headers["Authorization"] = f"Bearer {os.environ['GITHUB_TOKEN']}"
+        
+        # Download, checksum and extraction happen in one streaming pass
+        start = time.monotonic()
+        artifact_dir = self.artifact_cache.fetch(commit_sha, artifact["url"], artifact.get("sha256"), headers)
+        print(f"✅ Artifact extracted to: {artifact_dir} ({time.monotonic() - start:.1f}s)")
+        return artifact_dir
 
-    def create_container_snapshot(self, description: str) -> str:
+    async def create_container_snapshot(self, description: str) -> str:
         """Create a snapshot of the container before deployment"""
         print(f"📸 Creating container snapshot: {description}")
         
-        # Note: Proxmox MCP doesn't have snapshot functionality yet
-        # This would be implemented as a direct API call or SSH command
-        snapshot_name = f"pre-deploy-{int(time.time())}"
+        # Records the live release so a restore can put the index back in step
+        snapshot_name = await self.snapshots.create_async(description, release=self.release_index.current)
         
-        # Simulate snapshot creation
-        print(f"✅ Snapshot created: {snapshot_name}")
+        duration = self.snapshots.catalog["snapshots"][snapshot_name]["duration"]
+        print(f"✅ Snapshot created: {snapshot_name} ({duration:.1f}s)")
         return snapshot_name
 
-    def deploy_artifact(self, artifact_path: str, commit_sha: str) -> str:
-        """Deploy artifact using symlink-based atomic deployment"""
-        print(f"🚀 Deploying artifact with SHA {commit_sha}")
-        
-        release_dir = f"/opt/{self.project_name}/releases/{commit_sha}"
-        current_link = f"/opt/{self.project_name}/current"
-        
-        # Commands to run on the container
-        deploy_commands = [
-            f"mkdir -p {release_dir}",
-            f"tar -xzf {artifact_path} -C {release_dir}",
-            f"cd {release_dir} && pip install -r requirements.txt",
-            f"cd {release_dir} && python manage.py collectstatic --noinput",
-            f"cd {release_dir} && python manage.py migrate",
-            f"ln -sfn {release_dir} {current_link}",
-            f"systemctl restart {self.project_name}",
-            f"systemctl restart nginx"
-        ]
-        
-        # In a real implementation, these would be executed via SSH or container exec
-        for cmd in deploy_commands:
-            print(f"  Executing: {cmd}")
+    async def prune_snapshots(self):
+        """Apply the snapshot count/age/space limits after a successful deploy"""
+        try:
+            if self.snapshots.max_bytes is not None:
+                await self.snapshots.refresh_async()
+            pruned = await self.snapshots.prune_async()
+        except Exception as e:
+            print(f"⚠️  Snapshot pruning failed: {e}")
+            return
+        if pruned:
+            print(f"🧹 Pruned snapshots: {', '.join(pruned)}")
+
+    def release_paths(self, commit_sha: str) -> Tuple[str, str]:
+        """Return (release_dir, current_link) for a commit"""
+        return f"/opt/{self.project_name}/releases/{commit_sha}", f"/opt/{self.project_name}/current"
+
+    async def run_remote(self, cmd: str) -> str:
+        """Run a command on the container and return its output"""
+        # In a real implementation, this would be executed via SSH or container exec
+        print(f"  Executing: {cmd}")
+        return ""
+
+    async def push_tree(self, local_dir: str, release_dir: str, link_dest: str) -> str:
+        """rsync a local tree into a container release dir, hardlinking files unchanged from link_dest; returns --stats"""
+        process = await asyncio.create_subprocess_exec(
+            "rsync", "-a", "--stats", f"--exclude=/{MANIFEST_NAME}", f"--link-dest={link_dest}/",
+            f"{local_dir}/", f"{self.ssh_target}:{release_dir}/",
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(f"rsync to {self.ssh_target} failed: {stderr.decode(errors='replace').strip()}")
+        return stdout.decode(errors="replace")
+
+    def lockfile_hash(self, artifact_dir: str) -> str:
+        """Key for the shared dependency tree: hash of requirements.txt"""
+        digest = hashlib.sha256()
+        try:
+            with open(os.path.join(artifact_dir, "requirements.txt"), "rb") as f:
+                digest.update(f.read())
+        except FileNotFoundError:
+            pass
+        return digest.hexdigest()[:16]
+
+    def parse_rsync_stats(self, output: str) -> Optional[Dict[str, int]]:
+        """Written/reused counts from `rsync --stats`; with --link-dest everything not transferred was hardlinked"""
+        def stat(pattern: str) -> Optional[int]:
+            match = re.search(pattern, output)
+            return int(match.group(1).replace(",", "")) if match else None
         
-        print(f"✅ Deployment complete: {release_dir}")
-        return release_dir
+        files_total = stat(r"Number of files: [\d,]+ \(reg: ([\d,]+)")
+        files_written = stat(r"Number of regular files transferred: ([\d,]+)")
+        bytes_total = stat(r"Total file size: ([\d,]+)")
+        bytes_written = stat(r"Total transferred file size: ([\d,]+)")
+        if None in (files_total, files_written, bytes_total, bytes_written):
+            return None
+        return {"files_written": files_written, "bytes_written": bytes_written,
+                "files_reused": files_total - files_written, "bytes_reused": bytes_total - bytes_written}
+
+    def release_delta(self, new_dir: str, old_dir: Optional[str]) -> Dict[str, int]:
+        """Compare two release trees using rsync's size+mtime quick check"""
+        delta = {"files_written": 0, "bytes_written": 0, "files_reused": 0, "bytes_reused": 0}
+        for dirpath, _, filenames in os.walk(new_dir):
+            for filename in filenames:
+                if dirpath == new_dir and filename == MANIFEST_NAME:
+                    continue
+                new_path = os.path.join(dirpath, filename)
+                new_stat = os.lstat(new_path)
+                reused = False
+                if old_dir:
+                    try:
+                        old_stat = os.lstat(os.path.join(old_dir, os.path.relpath(new_path, new_dir)))
+                        reused = (old_stat.st_size, int(old_stat.st_mtime)) == (new_stat.st_size, int(new_stat.st_mtime))
+                    except OSError:
+                        pass
+                kind = "reused" if reused else "written"
+                delta[f"files_{kind}"] += 1
+                delta[f"bytes_{kind}"] += new_stat.st_size
+        return delta
+
+    def emit_event(self, stage: str, status: str, **fields):
+        """Record a structured pipeline event and append it to the events file"""
+        event = {"timestamp": time.time(), "project": self.project_name,
+                 "container": self.container_id, "stage": stage, "status": status, **fields}
+        self.events.append(event)
+        if self.events_file:
+            with open(self.events_file, "a") as f:
+                f.write(json.dumps(event) + "\n")
+
+    async def run_pipeline(self, stages: Dict[str, Tuple[Callable[[], Awaitable[Any]], List[str]]]) -> Dict[str, Any]:
+        """Run stages as soon as their dependencies finish; independent stages overlap"""
+        results: Dict[str, Any] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_stage(name: str):
+            stage, dependencies = stages[name]
+            await asyncio.gather(*(tasks[dep] for dep in dependencies))
+            self.emit_event(name, "started")
+            start = time.monotonic()
+            try:
+                results[name] = await stage()
+            except Exception as e:
+                self.emit_event(name, "failed", duration=time.monotonic() - start, error=str(e))
+                raise
+            self.emit_event(name, "completed", duration=time.monotonic() - start)
+            return results[name]
+
+        for name in stages:
+            tasks[name] = asyncio.ensure_future(run_stage(name))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        return results
+
+    def print_stage_timings(self):
+        """Summarize completed stage durations, slowest first"""
+        completed = [e for e in self.events if e["status"] == "completed"]
+        if not completed:
+            return
+        print("⏱️  Stage timings:")
+        for event in sorted(completed, key=lambda e: e["duration"], reverse=True):
+            print(f"   {event['stage']}: {event['duration']:.2f}s")
+        print(f"   Bottleneck: {max(completed, key=lambda e: e['duration'])['stage']}")
 
     def health_check(self, timeout: int = 60) -> bool:
         """Perform health check on deployed application"""
+        return asyncio.run(self.health_check_async(timeout))
+
+    async def health_check_async(self, timeout: int = 60) -> bool:
+        """Probe the health endpoints until they pass repeatedly or the timeout is spent"""
         print(f"🏥 Performing health check (timeout: {timeout}s)")
         
-        # Simulate health check
-        time.sleep(2)
+        engine = HealthProbeEngine(self.switcher.health_urls(), timeout=timeout)
+        result = await engine.run()
+        engine.report(result)
+        self.emit_event("health_check", "completed" if result["healthy"] else "failed",
+                        duration=result["duration"], probes=result["probes"])
         
-        print("✅ Health check passed")
+        if not result["healthy"]:
+            print(f"❌ Health check failed after {result['duration']:.1f}s")
+            return False
+        print(f"✅ Health check passed in {result['duration']:.1f}s")
         return True
 
-    def rollback_to_previous(self) -> str:
-        """Rollback to previous release using symlink switching"""
+    def rollback_to_previous(self) -> Optional[str]:
+        """Rollback to the previous (or last known good) release using symlink switching"""
+        return asyncio.run(self.rollback_to_previous_async())
+
+    async def rollback_to_previous_async(self) -> Optional[str]:
         print("🔄 Rolling back to previous release")
         
-        # Get previous release directory
-        releases_dir = f"/opt/{self.project_name}/releases"
-        current_link = f"/opt/{self.project_name}/current"
-        
-        # Commands to rollback
-        rollback_commands = [
-            f"ls -t {releases_dir} | head -2 | tail -1",  # Get previous release
-            f"ln -sfn {releases_dir}/$(ls -t {releases_dir} | head -2 | tail -1) {current_link}",
-            f"systemctl restart {self.project_name}",
-            f"systemctl restart nginx"
-        ]
+        target = self.release_index.rollback_target()
+        if not target:
+            print("❌ No previous release recorded in the release index")
+            return None
         
-        for cmd in rollback_commands:
-            print(f"  Executing: {cmd}")
+        release_dir, current_link = self.release_paths(target)
+        activation = await self.switcher.activate(release_dir, current_link)
+        self.emit_event("rollback", "completed", release=target, **activation)
         
-        print("✅ Rollback complete")
-        return "previous-release"
+        self.release_index.mark_current(target)
+        await warm_up_release(self.release_index, target, self.switcher.probe_url())
+        print(f"✅ Rollback complete: {target}")
+        return target
 
     def cleanup_old_releases(self, keep_count: int = 5):
         """Clean up old release directories, keeping specified number"""
         print(f"🧹 Cleaning up old releases (keeping {keep_count})")
         
-        releases_dir = f"/opt/{self.project_name}/releases"
-        cleanup_cmd = f"cd {releases_dir} && ls -t | tail -n +{keep_count + 1} | xargs rm -rf"
-        
-        print(f"  Executing: {cleanup_cmd}")
+        # The index never prunes the current, previous or last known good release
+        for commit_sha in self.release_index.prune(keep_count):
+            print(f"  Executing: rm -rf {self.release_paths(commit_sha)[0]}")
         print("✅ Cleanup complete")
 
     def deploy(self, owner: str, repo: str, branch: str = "main", run_id: Optional[str] = None) -> bool:
         """Main deployment orchestration method"""
+        return asyncio.run(self.deploy_async(owner, repo, branch, run_id))
+
+    async def deploy_async(self, owner: str, repo: str, branch: str = "main", run_id: Optional[str] = None) -> bool:
+        """Deploy via a stage pipeline that overlaps independent work"""
+        state: Dict[str, Any] = {}
         try:
             print(f"🚀 Starting MCP-powered deployment for {owner}/{repo}")
             print(f"   Project: {self.project_name}")
             print(f"   Container: {self.container_id}")
             print(f"   Branch: {branch}")
             
-            # Step 1: Get commit SHA for tracking
-            commit_sha = self.get_latest_commit_sha(owner, repo, branch)
-            
-            # Step 2: Create pre-deployment snapshot
-            snapshot_name = self.create_container_snapshot(f"pre-deploy-{commit_sha}")
-            
-            # Step 3: Download release artifact
             if not run_id:
                 # Get latest successful workflow run
                 print("🔍 Finding latest successful workflow run")
                 run_id = "latest"  # Simplified for demo
             
-            artifact_path = self.download_release_artifact(owner, repo, run_id)
+            # The previous release and rollback target come from the index
+            await seed_from_container(self.release_index, self.run_remote, self.project_name)
+            
+            def current_release_dir() -> str:
+                return self.release_paths(state["commit_sha"])[0]
+            
+            async def resolve_commit():
+                state["commit_sha"] = await asyncio.to_thread(self.get_latest_commit_sha, owner, repo, branch)
             
-            # Step 4: Deploy with atomic symlink switching
-            release_dir = self.deploy_artifact(artifact_path, commit_sha)
+            async def snapshot_container():
+                state["snapshot"] = await self.create_container_snapshot(f"pre-deploy-{state['commit_sha']}")
             
-            # Step 5: Health check
-            if not self.health_check():
+            async def download_artifact():
+                state["artifact_dir"] = await asyncio.to_thread(
+                    self.download_release_artifact, owner, repo, run_id, state["commit_sha"])
+            
+            async def push_release():
+                print(f"🚀 Deploying artifact with SHA {state['commit_sha']}")
+                release_dir, current_link = self.release_paths(state["commit_sha"])
+                previous = self.release_index.current
+                
+                # Unchanged files are hardlinked from the live release; only
+                # changed files are actually written
+                await self.run_remote(f"mkdir -p {release_dir}")
+                stats = await self.push_tree(state["artifact_dir"], release_dir, current_link)
+                
+                delta = self.parse_rsync_stats(stats)
+                if delta is None:
+                    # No stats back from the transport: compare against the cached previous tree
+                    previous_dir = self.artifact_cache.get(previous) if previous else None
+                    delta = self.release_delta(state["artifact_dir"], previous_dir)
+                print(f"   Release delta vs {previous or 'unknown previous release'}: "
+                      f"{delta['bytes_written']} bytes written ({delta['files_written']} files), "
+                      f"{delta['bytes_reused']} bytes reused ({delta['files_reused']} files)")
+                self.emit_event("push_release", "delta", previous=previous or None, **delta)
+            
+            async def install_dependencies():
+                # Dependency trees are shared between releases with the same lockfile.
+                # A venv can't be moved (its scripts hard-code the interpreter path),
+                # so it is built in place and a sentinel marks it complete
+                deps_root = f"/opt/{self.project_name}/deps"
+                deps_dir = f"{deps_root}/{self.lockfile_hash(state['artifact_dir'])}"
+                release_dir = current_release_dir()
+                await self.run_remote(
+                    f"mkdir -p {deps_root} && flock {deps_dir}.lock sh -c '"
+                    f"test -f {deps_dir}/.complete || (rm -rf {deps_dir} && python -m venv {deps_dir} && "
+                    f"{deps_dir}/bin/pip install -r {release_dir}/requirements.txt && touch {deps_dir}/.complete)'"
+                )
+                await self.run_remote(f"ln -sfn {deps_dir} {release_dir}/.venv")
+            
+            async def collect_static():
+                await self.run_remote(f"cd {current_release_dir()} && .venv/bin/python manage.py collectstatic --noinput")
+            
+            async def run_migrations():
+                await self.run_remote(f"cd {current_release_dir()} && .venv/bin/python manage.py migrate")
+            
+            async def switch_release():
+                release_dir, current_link = self.release_paths(state["commit_sha"])
+                manifest = self.artifact_cache.read_manifest(state["commit_sha"]) or {}
+                self.release_index.record_release(state["commit_sha"], manifest.get("artifact_sha256"), manifest.get("size"))
+                activation = await self.switcher.activate(release_dir, current_link)
+                self.emit_event("switch_release", "activated", **activation)
+                self.release_index.mark_current(state["commit_sha"])
+                state["switched"] = True
+                print(f"✅ Deployment complete: {release_dir}")
+            
+            async def warm_up():
+                result = await warm_up_release(self.release_index, state["commit_sha"], self.switcher.probe_url())
+                self.emit_event("warm_up", "warmed", **result)
+            
+            # Snapshot only overlaps the stages that leave the container's state
+            # alone; migrations mutate the database, so they wait for it
+            await self.run_pipeline({
+                "commit_sha": (resolve_commit, []),
+                "snapshot": (snapshot_container, ["commit_sha"]),
+                "download": (download_artifact, ["commit_sha"]),
+                "push_release": (push_release, ["download"]),
+                "install_dependencies": (install_dependencies, ["push_release"]),
+                "collect_static": (collect_static, ["install_dependencies"]),
+                "migrate": (run_migrations, ["snapshot", "install_dependencies"]),
+                "switch_release": (switch_release, ["collect_static", "migrate"]),
+                "warm_up": (warm_up, ["switch_release"])
+            })
+            commit_sha, snapshot_name = state["commit_sha"], state["snapshot"]
+            release_dir = current_release_dir()
+            self.print_stage_timings()
+            
+            # Health check
+            healthy = await self.health_check_async()
+            self.release_index.record_health(commit_sha, healthy)
+            if not healthy:
                 print("❌ Health check failed, rolling back")
-                self.rollback_to_previous()
+                await self.rollback_to_previous_async()
                 return False
             
-            # Step 6: Cleanup old releases
+            # Cleanup old releases and snapshots
             self.cleanup_old_releases()
+            await self.prune_snapshots()
             
             print(f"✅ Deployment successful: {commit_sha}")
             print(f"   Release directory: {release_dir}")
@@ -219,23 +418,65 @@ class MCPDeploymentOrchestrator:
             
         except Exception as e:
             print(f"❌ Deployment failed: {str(e)}")
+            self.print_stage_timings()
+            if not state.get("switched"):
+                print("   Live release untouched, nothing to roll back")
+                return False
             print("🔄 Attempting rollback")
-            self.rollback_to_previous()
+            await self.rollback_to_previous_async()
             return False
 
+async def deploy_fleet(project_name: str, targets, owner: str, repo: str, branch: str = "main",
+                       max_in_flight: int = 2, restart_mode: Optional[str] = None) -> Dict[str, Any]:
+    """Deploy to several containers: canary first, then the rest concurrently"""
+    orchestrators: Dict[str, MCPDeploymentOrchestrator] = {}
+    
+    async def deploy_node(container_id: str, app_url: Optional[str]) -> bool:
+        orchestrator = orchestrators[container_id] = MCPDeploymentOrchestrator(
+            project_name, container_id, restart_mode=restart_mode, app_url=app_url)
+        return await orchestrator.deploy_async(owner, repo, branch)
+    
+    result = await run_wave(targets, deploy_node, max_in_flight)
+    for container_id, orchestrator in orchestrators.items():
+        result["nodes"][container_id]["stages"] = {
+            event["stage"]: round(event["duration"], 3) for event in orchestrator.events if event["status"] == "completed"
+        }
+    report_fleet(result)
+    return result
+
 def main():
-    if len(sys.argv) < 4:
-        print("Usage: python mcp-deploy.py <project> <container_id> <owner> <repo> [branch]")
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if len(args) < 4:
+        print("Usage: python mcp-deploy.py <project> <container_id[,container_id[=app_url]...]> <owner> <repo> [branch]")
+        print("                            [--zero-downtime] [--max-in-flight=N]")
         print("Example: python mcp-deploy.py jw-attendant-scheduler 132 cloudigan jw-attendant-scheduler staging")
+        print("Fleet:   python mcp-deploy.py jw-attendant-scheduler 132=http://10.92.3.132:3001,134=http://10.92.3.134:3001 \\")
+        print("             cloudigan jw-attendant-scheduler staging")
+        print("         (or set MCP_FLEET_APP_URL=http://10.92.3.{container_id}:3001 and pass 132,134)")
+        print("Zero-downtime: MCP_APP_URL=http://10.92.3.132:3001 MCP_FRONT_URL=http://10.92.3.132 \\")
+        print("             python mcp-deploy.py jw-attendant-scheduler 132 cloudigan jw-attendant-scheduler staging --zero-downtime")
+        print("         (needs the {project}@.service template unit reading /opt/<project>/run/<port>.env,")
+        print("          see release_switch.py; MCP_FRONT_URL is nginx and may contain {container_id})")
         sys.exit(1)
     
-    project_name = sys.argv[1]
-    container_id = sys.argv[2]
-    owner = sys.argv[3]
-    repo = sys.argv[4]
-    branch = sys.argv[5] if len(sys.argv) > 5 else "main"
+    project_name = args[0]
+    container_id = args[1]
+    owner = args[2]
+    repo = args[3]
+    branch = args[4] if len(args) > 4 else "main"
+    restart_mode = "zero-downtime" if "--zero-downtime" in sys.argv else None
+    max_in_flight = next((int(arg.split("=", 1)[1]) for arg in sys.argv if arg.startswith("--max-in-flight=")), 2)
     
-    orchestrator = MCPDeploymentOrchestrator(project_name, container_id)
+    try:
+        if is_fleet(container_id):
+            result = asyncio.run(deploy_fleet(project_name, parse_targets(container_id), owner, repo, branch,
+                                              max_in_flight, restart_mode))
+            sys.exit(0 if result["success"] else 1)
+        
+        orchestrator = MCPDeploymentOrchestrator(project_name, container_id, restart_mode=restart_mode)
+    except ValueError as e:
+        print(str(e))
+        sys.exit(1)
     success = orchestrator.deploy(owner, repo, branch)
     
     sys.exit(0 if success else 1)
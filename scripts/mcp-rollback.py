@@ -4,59 +4,69 @@ MCP-Powered Rollback Script
 Ultra-fast rollback using symlink switching and container snapshots
 """
 
-import json
-import subprocess
+import asyncio
 import sys
 import time
-from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from fleet import is_fleet, parse_targets, report as report_fleet, run_wave
+from health_probe import HealthProbeEngine, configured_health_urls
+from mcp_client import MCPClientError, get_mcp_client
+from release_index import ReleaseIndex, seed_from_container
+from release_switch import ReleaseSwitcher, configured_front_url
+from release_warmup import configured_warmup_urls, warm_up_release
+from snapshot_manager import SnapshotError, SnapshotManager
 
 class MCPRollbackOrchestrator:
-    def __init__(self, project_name: str, container_id: str, node: str = "proxmox"):
+    def __init__(self, project_name: str, container_id: str, node: str = "proxmox",
+                 restart_mode: Optional[str] = None, app_url: Optional[str] = None):
         self.project_name = project_name
         self.container_id = container_id
         self.node = node
         self.proxmox_mcp_path = "/Users/cory/Documents/Cloudy-Work/homelab/mcp-server-proxmox/dist/index.js"
+        self.proxmox_mcp = get_mcp_client(self.proxmox_mcp_path, "Proxmox")
+        # Release history written by mcp-deploy.py
+        self.release_index = ReleaseIndex(project_name, container_id)
+        self.snapshots = SnapshotManager(self.proxmox_mcp, node, project_name, container_id)
+        # Per-node app URL in fleet mode; defaults to MCP_APP_URL
+        self.app_url = app_url
+        # Fail before touching the container when there is nothing to probe
+        configured_health_urls(app_url)
+        configured_warmup_urls(app_url)
+        self.switcher = ReleaseSwitcher(project_name, self.run_remote, self.release_index, restart_mode,
+                                        app_url=app_url, front_url=configured_front_url(container_id))
         
     def call_proxmox_mcp(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
         """Call Proxmox MCP with specified method and parameters"""
-        request = {
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": f"tools/call",
-            "params": {
-                "name": method,
-                "arguments": params
-            }
-        }
-        
-        result = subprocess.run(
-            ["node", self.proxmox_mcp_path],
-            input=json.dumps(request),
-            text=True,
-            capture_output=True,
-            cwd=Path(self.proxmox_mcp_path).parent
-        )
-        
-        if result.returncode != 0:
-            raise Exception(f"Proxmox MCP call failed: {result.stderr}")
-            
-        return json.loads(result.stdout.split('\n')[1])
+        return self.proxmox_mcp.call_tool(method, params)
+
+    async def run_remote(self, cmd: str) -> str:
+        """Run a command on the container and return its output"""
+        # In real implementation, execute via SSH
+        print(f"  Executing: {cmd}")
+        return ""
+
+    def load_release_history(self):
+        """Fall back to the release directories on the container when this host has no index"""
+        asyncio.run(seed_from_container(self.release_index, self.run_remote, self.project_name))
 
     def list_available_releases(self) -> list:
         """List available release directories for rollback"""
         print("📋 Listing available releases")
         
-        releases_dir = f"/opt/{self.project_name}/releases"
+        releases = []
+        for release in self.release_index.releases():
+            deployed_at = time.strftime("%Y-%m-%d %H:%M", time.localtime(release.get("deployed_at", 0)))
+            label = f"{release['sha']} - {deployed_at} [{release.get('health', 'unknown')}]"
+            if release.get("warmup"):
+                label += f" warm in {release['warmup']['time_to_warm']:.1f}s"
+            if release["sha"] == self.release_index.current:
+                label += " (current)"
+            releases.append(label)
         
-        # In real implementation, this would SSH to container and list directories
-        # Simulated response for demo
-        releases = [
-            "abc123de - 2024-01-15 14:30 (current)",
-            "def456gh - 2024-01-15 12:15",
-            "ghi789jk - 2024-01-14 16:45",
-            "lmn012op - 2024-01-14 10:20"
-        ]
+        if not releases:
+            print("No releases recorded in the release index")
+            return releases
         
         print("Available releases:")
         for i, release in enumerate(releases):
@@ -72,18 +82,19 @@ class MCPRollbackOrchestrator:
         current_link = f"/opt/{self.project_name}/current"
         target_path = f"{releases_dir}/{target_release}"
         
-        rollback_commands = [
-            f"test -d {target_path}",  # Verify target exists
-            f"ln -sfn {target_path} {current_link}",
-            f"systemctl restart {self.project_name}",
-            f"systemctl restart nginx"
-        ]
+        async def switch():
+            await self.run_remote(f"test -d {target_path}")  # Verify target exists
+            await self.switcher.activate(target_path, current_link)
+            self.release_index.mark_current(target_release)
+            await warm_up_release(self.release_index, target_release, self.switcher.probe_url())
         
         start_time = time.time()
         
-        for cmd in rollback_commands:
-            print(f"  Executing: {cmd}")
-            # In real implementation, execute via SSH
+        try:
+            asyncio.run(switch())
+        except RuntimeError as e:
+            print(f"❌ Rollback aborted: {e}")
+            return False
         
         elapsed = time.time() - start_time
         print(f"✅ Rollback complete in {elapsed:.2f} seconds")
@@ -93,57 +104,71 @@ class MCPRollbackOrchestrator:
         """Quick rollback to previous release"""
         print("🔄 Rolling back to previous release")
         
-        releases_dir = f"/opt/{self.project_name}/releases"
-        current_link = f"/opt/{self.project_name}/current"
-        
-        rollback_commands = [
-            f"PREV=$(ls -t {releases_dir} | head -2 | tail -1)",
-            f"ln -sfn {releases_dir}/$PREV {current_link}",
-            f"systemctl restart {self.project_name}",
-            f"systemctl restart nginx"
-        ]
-        
-        start_time = time.time()
-        
-        for cmd in rollback_commands:
-            print(f"  Executing: {cmd}")
+        target = self.release_index.rollback_target()
+        if not target:
+            print("❌ No previous release recorded in the release index")
+            return False
+        return self.rollback_to_release(target)
+
+    def rollback_to_last_known_good(self) -> bool:
+        """Rollback to the newest release that passed its health check"""
+        print("🔄 Rolling back to last known good release")
         
-        elapsed = time.time() - start_time
-        print(f"✅ Quick rollback complete in {elapsed:.2f} seconds")
-        return True
+        target = self.release_index.last_known_good()
+        if not target:
+            print("❌ No healthy release recorded in the release index")
+            return False
+        return self.rollback_to_release(target)
 
     def rollback_to_snapshot(self, snapshot_name: str) -> bool:
         """Rollback container to specific snapshot (nuclear option)"""
         print(f"💥 Rolling back container to snapshot: {snapshot_name}")
         print("⚠️  WARNING: This will restore the entire container state")
         
-        # This would use Proxmox MCP to restore snapshot
-        # For now, simulated
+        rto = self.snapshots.restore_rto()
+        if rto is not None:
+            print(f"   Expected downtime: up to {rto:.1f}s (slowest recorded restore)")
         
-        restore_commands = [
-            f"Stop container {self.container_id}",
-            f"Restore snapshot {snapshot_name}",
-            f"Start container {self.container_id}"
-        ]
+        try:
+            timings = self.snapshots.restore(snapshot_name)
+        except (SnapshotError, MCPClientError) as e:
+            print(f"❌ Snapshot rollback failed: {e}")
+            return False
         
-        start_time = time.time()
-        
-        for cmd in restore_commands:
-            print(f"  Executing: {cmd}")
-            time.sleep(1)  # Simulate restore time
+        # The restored container serves whatever release was live at snapshot time
+        snapshot = self.snapshots.catalog["snapshots"].get(snapshot_name)
+        if snapshot and snapshot.get("release"):
+            self.release_index.mark_current(snapshot["release"])
         
-        elapsed = time.time() - start_time
-        print(f"✅ Snapshot rollback complete in {elapsed:.2f} seconds")
+        print(f"✅ Snapshot rollback complete in {timings['total']:.2f} seconds "
+              f"(stop {timings['stop']:.1f}s, restore {timings['rollback']:.1f}s, start {timings['start']:.1f}s)")
         return True
 
-    def health_check(self) -> bool:
+    def list_snapshots(self) -> list:
+        """List catalogued snapshots for the nuclear option"""
+        snapshots = self.snapshots.snapshots()
+        if not snapshots:
+            print("No snapshots recorded in the snapshot catalog")
+        for snapshot in snapshots:
+            created_at = time.strftime("%Y-%m-%d %H:%M", time.localtime(snapshot["created_at"]))
+            print(f"  {snapshot['name']} - {created_at} (release {snapshot.get('release') or 'unknown'})")
+        return snapshots
+
+    def health_check(self, timeout: int = 60) -> bool:
         """Verify application is running after rollback"""
         print("🏥 Performing post-rollback health check")
         
-        # Simulate health check
-        time.sleep(2)
+        engine = HealthProbeEngine(self.switcher.health_urls(), timeout=timeout)
+        result = asyncio.run(engine.run())
+        engine.report(result)
         
-        print("✅ Health check passed")
+        if self.release_index.current:
+            self.release_index.record_health(self.release_index.current, result["healthy"])
+        
+        if not result["healthy"]:
+            print(f"❌ Health check failed after {result['duration']:.1f}s")
+            return False
+        print(f"✅ Health check passed in {result['duration']:.1f}s")
         return True
 
     def interactive_rollback(self):
@@ -152,11 +177,13 @@ class MCPRollbackOrchestrator:
         print(f"   Container: {self.container_id}")
         print()
         
+        self.load_release_history()
         releases = self.list_available_releases()
         
         print()
         print("Rollback options:")
         print("  0. Quick rollback to previous release")
+        print("  g. Rollback to last known good release")
         print("  1-N. Rollback to specific release")
         print("  s. Rollback to snapshot (nuclear option)")
         print("  q. Quit")
@@ -169,7 +196,11 @@ class MCPRollbackOrchestrator:
         elif choice == '0':
             if self.rollback_to_previous():
                 self.health_check()
+        elif choice == 'g':
+            if self.rollback_to_last_known_good():
+                self.health_check()
         elif choice == 's':
+            self.list_snapshots()
             snapshot_name = input("Enter snapshot name: ").strip()
             if snapshot_name:
                 if self.rollback_to_snapshot(snapshot_name):
@@ -186,12 +217,41 @@ class MCPRollbackOrchestrator:
         else:
             print("Invalid option")
 
+    def run_mode(self, mode: str, argument: Optional[str] = None) -> bool:
+        """Run a non-interactive rollback mode followed by the health check"""
+        self.load_release_history()
+        if mode == "quick":
+            success = self.rollback_to_previous()
+        elif mode == "good":
+            success = self.rollback_to_last_known_good()
+        elif mode == "release" and argument:
+            success = self.rollback_to_release(argument)
+        elif mode == "snapshot" and argument:
+            success = self.rollback_to_snapshot(argument)
+        else:
+            raise ValueError(f"Invalid mode: {mode}")
+        return success and self.health_check()
+
+async def rollback_fleet(project_name: str, targets, mode: str, argument: Optional[str] = None,
+                         max_in_flight: int = 2, restart_mode: Optional[str] = None) -> Dict[str, Any]:
+    """Roll back several containers: canary first, then the rest concurrently"""
+    async def rollback_node(container_id: str, app_url: Optional[str]) -> bool:
+        orchestrator = MCPRollbackOrchestrator(project_name, container_id, restart_mode=restart_mode, app_url=app_url)
+        return await asyncio.to_thread(orchestrator.run_mode, mode, argument)
+    
+    result = await run_wave(targets, rollback_node, max_in_flight)
+    report_fleet(result)
+    return result
+
 def main():
-    if len(sys.argv) < 3:
-        print("Usage: python mcp-rollback.py <project> <container_id> [mode]")
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if len(args) < 2:
+        print("Usage: python mcp-rollback.py <project> <container_id[,container_id[=app_url]...]> [mode]")
+        print("                              [--zero-downtime] [--max-in-flight=N]")
         print("Modes:")
         print("  interactive (default) - Interactive rollback selection")
         print("  quick - Rollback to previous release")
+        print("  good - Rollback to last known good release")
         print("  release <hash> - Rollback to specific release")
         print("  snapshot <name> - Rollback to snapshot")
         print()
@@ -199,35 +259,33 @@ def main():
         print("  python mcp-rollback.py jw-attendant-scheduler 132")
         print("  python mcp-rollback.py jw-attendant-scheduler 132 quick")
         print("  python mcp-rollback.py jw-attendant-scheduler 132 release abc123de")
+        print("  MCP_FLEET_APP_URL=http://10.92.3.{container_id}:3001 python mcp-rollback.py jw-attendant-scheduler 132,134 quick")
+        print("  MCP_FRONT_URL=http://10.92.3.132 python mcp-rollback.py jw-attendant-scheduler 132 quick --zero-downtime")
+        print("  (zero-downtime containers need MCP_FRONT_URL, the nginx URL; see release_switch.py)")
         sys.exit(1)
     
-    project_name = sys.argv[1]
-    container_id = sys.argv[2]
-    mode = sys.argv[3] if len(sys.argv) > 3 else "interactive"
+    project_name = args[0]
+    container_id = args[1]
+    mode = args[2] if len(args) > 2 else "interactive"
+    argument = args[3] if len(args) > 3 else None
+    restart_mode = "zero-downtime" if "--zero-downtime" in sys.argv else None
+    max_in_flight = next((int(arg.split("=", 1)[1]) for arg in sys.argv if arg.startswith("--max-in-flight=")), 2)
     
-    orchestrator = MCPRollbackOrchestrator(project_name, container_id)
-    
-    if mode == "interactive":
-        orchestrator.interactive_rollback()
-    elif mode == "quick":
-        success = orchestrator.rollback_to_previous()
-        if success:
-            orchestrator.health_check()
-        sys.exit(0 if success else 1)
-    elif mode == "release" and len(sys.argv) > 4:
-        release_hash = sys.argv[4]
-        success = orchestrator.rollback_to_release(release_hash)
-        if success:
-            orchestrator.health_check()
-        sys.exit(0 if success else 1)
-    elif mode == "snapshot" and len(sys.argv) > 4:
-        snapshot_name = sys.argv[4]
-        success = orchestrator.rollback_to_snapshot(snapshot_name)
-        if success:
-            orchestrator.health_check()
-        sys.exit(0 if success else 1)
-    else:
-        print(f"Invalid mode: {mode}")
+    try:
+        if is_fleet(container_id):
+            if mode == "interactive":
+                raise ValueError("Interactive mode is not available for fleets")
+            result = asyncio.run(rollback_fleet(project_name, parse_targets(container_id), mode, argument,
+                                                max_in_flight, restart_mode))
+            sys.exit(0 if result["success"] else 1)
+        
+        orchestrator = MCPRollbackOrchestrator(project_name, container_id, restart_mode=restart_mode)
+        if mode == "interactive":
+            orchestrator.interactive_rollback()
+        else:
+            sys.exit(0 if orchestrator.run_mode(mode, argument) else 1)
+    except ValueError as e:
+        print(str(e))
         sys.exit(1)
 
 if __name__ == "__main__":
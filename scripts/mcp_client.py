@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Persistent MCP stdio client shared by the deploy and rollback orchestrators
+Keeps one long-lived server process per MCP server and multiplexes JSON-RPC
+requests over it by id, so callers can pipeline or run calls concurrently
+"""
+
+import atexit
+import itertools
+import json
+import subprocess
+import threading
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+PROTOCOL_VERSION = "2024-11-05"
+STDERR_TAIL_LINES = 20
+
+class MCPClientError(Exception):
+    pass
+
+class MCPClient:
+    def __init__(self, server_path: str, name: str = "MCP", timeout: float = 60.0):
+        self.server_path = server_path
+        self.name = name
+        self.timeout = timeout
+        self.process: Optional[subprocess.Popen] = None
+        self.stderr_tail: deque = deque(maxlen=STDERR_TAIL_LINES)
+        self.stderr_thread: Optional[threading.Thread] = None
+        self.pending: Dict[int, Future] = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+
+    def start(self):
+        """Spawn the server and perform the MCP initialize handshake"""
+        with self.lock:
+            if self.process and self.process.poll() is None:
+                return
+            self.process = subprocess.Popen(
+                ["node", self.server_path],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                bufsize=1,
+                cwd=Path(self.server_path).parent
+            )
+            self.stderr_tail.clear()
+            self.stderr_thread = threading.Thread(target=self._stderr_loop, args=(self.process,), daemon=True)
+            self.stderr_thread.start()
+            threading.Thread(target=self._read_loop, args=(self.process,), daemon=True).start()
+
+            # Held under the lock so concurrent callers never race the handshake
+            try:
+                response = self.request("initialize", {
+                    "protocolVersion": PROTOCOL_VERSION,
+                    "capabilities": {},
+                    "clientInfo": {"name": "mcp-deploy", "version": "1.0.0"}
+                })
+                error = response.get("error")
+                if error is None:
+                    self._send({"jsonrpc": "2.0", "method": "notifications/initialized"})
+            except Exception as e:
+                error = e
+            if error is None:
+                return
+
+            # Never leave a half-started server behind for the next caller
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+            if isinstance(error, MCPClientError):
+                raise error
+            raise MCPClientError(self._with_stderr(f"{self.name} MCP initialize failed: {error!r}"))
+
+    def _stderr_loop(self, process: subprocess.Popen):
+        """Keep the last lines the server logged so failures can show them"""
+        for line in process.stderr:
+            self.stderr_tail.append(line.rstrip())
+
+    def _with_stderr(self, message: str) -> str:
+        if self.stderr_thread:
+            self.stderr_thread.join(timeout=1)
+        if not self.stderr_tail:
+            return message
+        return message + "\n" + "\n".join(f"  {line}" for line in self.stderr_tail)
+
+    def _read_loop(self, process: subprocess.Popen):
+        """Resolve pending requests as responses arrive, in any order"""
+        for line in process.stdout:
+            line = line.strip()
+            if not line.startswith("{"):
+                continue  # Startup banners such as "GitHub MCP server running"
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            future = self.pending.pop(message.get("id"), None)
+            if future is not None:
+                future.set_result(message)
+
+        # Server exited: fail everything still waiting on it
+        error = MCPClientError(self._with_stderr(f"{self.name} MCP server exited with code {process.wait()}"))
+        for request_id in list(self.pending):
+            future = self.pending.pop(request_id, None)
+            if future is not None and not future.done():
+                future.set_exception(error)
+
+    def _send(self, message: Dict[str, Any]):
+        with self.write_lock:
+            try:
+                self.process.stdin.write(json.dumps(message) + "\n")
+                self.process.stdin.flush()
+            except (BrokenPipeError, OSError) as e:
+                raise MCPClientError(self._with_stderr(f"{self.name} MCP server is not accepting requests: {e}"))
+
+    def request_async(self, method: str, params: Dict[str, Any]) -> Future:
+        """Send a JSON-RPC request and return a future for its response"""
+        request_id = next(self.ids)
+        future: Future = Future()
+        self.pending[request_id] = future
+        try:
+            self._send({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params})
+        except MCPClientError as e:
+            self.pending.pop(request_id, None)
+            future.set_exception(e)
+        return future
+
+    def request(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Send a JSON-RPC request and wait for its response"""
+        return self.request_async(method, params).result(timeout=self.timeout)
+
+    def call_tool_async(self, tool: str, arguments: Dict[str, Any]) -> Future:
+        """Invoke an MCP tool without waiting; use for pipelined calls"""
+        self.start()
+        return self.request_async("tools/call", {"name": tool, "arguments": arguments})
+
+    def call_tool(self, tool: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Invoke an MCP tool and return the raw JSON-RPC response"""
+        return self.call_tool_async(tool, arguments).result(timeout=self.timeout)
+
+    def close(self):
+        with self.lock:
+            if not self.process:
+                return
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=5)
+            except Exception:
+                self.process.kill()
+            self.process = None
+
+_clients: Dict[str, MCPClient] = {}
+_clients_lock = threading.Lock()
+
+def get_mcp_client(server_path: str, name: str = "MCP") -> MCPClient:
+    """Return the shared client for a server, creating it on first use"""
+    with _clients_lock:
+        client = _clients.get(server_path)
+        if client is None:
+            client = _clients[server_path] = MCPClient(server_path, name)
+        return client
+
+@atexit.register
+def close_all_clients():
+    for client in list(_clients.values()):
+        client.close()
+    _clients.clear()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Persisted release manifest shared by the deploy and rollback orchestrators
+Records every release per project and container (SHA, timestamp, artifact
+hash, size, health outcome) plus current/previous pointers, so rollback
+targets and cleanup never depend on directory mtimes
+"""
+
+import json
+import os
+import time
+from typing import Awaitable, Callable, Dict, Any, List, Optional
+
+DEFAULT_INDEX_DIR = os.path.expanduser("~/.local/state/mcp-deploy")
+
+class ReleaseIndex:
+    def __init__(self, project_name: str, container_id: str, root: Optional[str] = None):
+        self.root = root or os.environ.get("MCP_RELEASE_INDEX_DIR", DEFAULT_INDEX_DIR)
+        self.path = os.path.join(self.root, f"{project_name}-{container_id}.json")
+        self.data = self.load()
+
+    def load(self) -> Dict[str, Any]:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"current": None, "previous": None, "releases": {}}
+
+    def save(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def get(self, sha: str) -> Optional[Dict[str, Any]]:
+        return self.data["releases"].get(sha)
+
+    @property
+    def current(self) -> Optional[str]:
+        return self.data["current"]
+
+    @property
+    def previous(self) -> Optional[str]:
+        return self.data["previous"]
+
+    @property
+    def active_port(self) -> Optional[int]:
+        """App port nginx currently routes to in zero-downtime mode"""
+        return self.data.get("active_port")
+
+    def set_active_port(self, port: int):
+        self.data["active_port"] = port
+        self.save()
+
+    @property
+    def restart_mode(self) -> Optional[str]:
+        """Activation mode of the live release; indexes from before modes were recorded imply it from the port"""
+        return self.data.get("restart_mode") or ("zero-downtime" if self.active_port else None)
+
+    def set_restart_mode(self, mode: str):
+        self.data["restart_mode"] = mode
+        self.save()
+
+    def record_release(self, sha: str, artifact_sha256: Optional[str] = None, size: Optional[int] = None):
+        """Add or refresh a release entry; health starts out pending"""
+        release = self.data["releases"].setdefault(sha, {"sha": sha})
+        release.update({
+            "deployed_at": time.time(),
+            "artifact_sha256": artifact_sha256,
+            "size": size,
+            "health": "pending"
+        })
+        self.save()
+
+    def mark_current(self, sha: str):
+        """Point current at a release, remembering what it replaced"""
+        if sha not in self.data["releases"]:
+            self.data["releases"][sha] = {"sha": sha, "deployed_at": time.time(), "health": "unknown"}
+        if self.data["current"] != sha:
+            self.data["previous"] = self.data["current"]
+            self.data["current"] = sha
+        self.data["releases"][sha]["activated_at"] = time.time()
+        self.save()
+
+    def record_health(self, sha: str, healthy: bool):
+        release = self.data["releases"].get(sha)
+        if release is None:
+            return
+        release["health"] = "healthy" if healthy else "unhealthy"
+        release["health_checked_at"] = time.time()
+        self.save()
+
+    def record_warmup(self, sha: str, result: Dict[str, Any]):
+        """Keep time-to-warm per release so regressions show up across deploys"""
+        release = self.data["releases"].get(sha)
+        if release is None:
+            return
+        release["warmup"] = {
+            "time_to_warm": round(result["time_to_warm"], 3),
+            "warm": result["warm"],
+            "p95_ms": result["p95_ms_final"],
+            "recorded_at": time.time()
+        }
+        self.save()
+
+    def seed(self, releases: Dict[str, float], current: Optional[str] = None):
+        """Fill in releases found on the container (SHA -> directory mtime); their health is unknown"""
+        for sha, deployed_at in releases.items():
+            self.data["releases"].setdefault(sha, {"sha": sha, "deployed_at": deployed_at, "health": "unknown"})
+        if current in self.data["releases"]:
+            self.data["current"] = current
+            older = [release["sha"] for release in self.releases() if release["sha"] != current]
+            self.data["previous"] = older[0] if older else None
+        self.save()
+
+    def releases(self) -> List[Dict[str, Any]]:
+        """Releases newest first by deployment time"""
+        return sorted(self.data["releases"].values(), key=lambda r: r.get("deployed_at", 0), reverse=True)
+
+    def last_known_good(self, exclude_current: bool = True) -> Optional[str]:
+        """Newest release whose health check passed"""
+        for release in self.releases():
+            if exclude_current and release["sha"] == self.current:
+                continue
+            if release.get("health") == "healthy":
+                return release["sha"]
+        return None
+
+    def rollback_target(self) -> Optional[str]:
+        """Release to return to: the previous one unless it is known bad"""
+        previous = self.previous
+        if previous and self.data["releases"].get(previous, {}).get("health") != "unhealthy":
+            return previous
+        return self.last_known_good()
+
+    def prune(self, keep_count: int) -> List[str]:
+        """Drop the oldest releases beyond keep_count; current and last known good are always kept"""
+        protected = {self.current, self.previous, self.last_known_good()}
+        removed = []
+        for release in self.releases()[keep_count:]:
+            if release["sha"] in protected:
+                continue
+            del self.data["releases"][release["sha"]]
+            removed.append(release["sha"])
+        if removed:
+            self.save()
+        return removed
+
+async def seed_from_container(release_index: ReleaseIndex, run_remote: Callable[[str], Awaitable[str]],
+                              project_name: str) -> bool:
+    """Rebuild an empty index from the release directories on the container
+    The index lives on whichever host runs the scripts, so a fresh host
+    would otherwise see no rollback targets at all"""
+    if release_index.data["releases"]:
+        return False
+    listing = await run_remote(f"cd /opt/{project_name}/releases && stat -c '%Y %n' *")
+    releases = {}
+    for line in listing.splitlines():
+        mtime, _, sha = line.strip().partition(" ")
+        if mtime.isdigit() and sha:
+            releases[sha] = float(mtime)
+    if not releases:
+        return False
+    current = os.path.basename((await run_remote(f"readlink -f /opt/{project_name}/current")).strip())
+    release_index.seed(releases, current or None)
+    print(f"📚 Release index rebuilt from {len(releases)} release directories on the container")
+    return True
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Release activation shared by the deploy and rollback orchestrators
+"restart" mode restarts the app and nginx in place; "zero-downtime" mode
+starts the release on the standby port, warms it with the health probes,
+swaps the nginx upstream with a reload and drains the old process, while
+measuring the request errors and latency seen through the switch
+
+Dependencies are not installed system-wide: each release links .venv to
+its shared dependency tree, so {project}.service has to run the app from
+/opt/{project}/current/.venv and the template unit from $RELEASE_DIR/.venv
+
+Zero-downtime mode depends on this contract on the container:
+- a systemd template unit {project}@.service that runs the release named by
+  RELEASE_DIR on port %i, loaded from EnvironmentFile=/opt/{project}/run/%i.env
+- nginx proxying the site to `upstream {project}`, defined only in
+  /etc/nginx/conf.d/{project}-upstream.conf (rewritten on every swap)
+- MCP_FRONT_URL set to the nginx front door (for fleets it may contain
+  {container_id}); the app URL only supplies the host for the instance probes,
+  which are addressed to the instance ports themselves
+"""
+
+import asyncio
+import os
+import time
+import urllib.parse
+from typing import Awaitable, Callable, Dict, Any, List, Optional
+
+from health_probe import HealthProbeEngine, configured_health_urls, percentile
+from release_index import ReleaseIndex
+
+RESTART_MODES = ("restart", "zero-downtime")
+DEFAULT_PORTS = (3001, 3002)
+
+def configured_front_url(container_id: str) -> Optional[str]:
+    """The nginx front-door URL from MCP_FRONT_URL, with {container_id} filled in"""
+    front_url = os.environ.get("MCP_FRONT_URL")
+    return front_url.format(container_id=container_id).rstrip("/") if front_url else None
+
+def with_port(url: str, port: int) -> str:
+    """The same URL addressed to another port on its host"""
+    parts = urllib.parse.urlsplit(url)
+    return urllib.parse.urlunsplit(parts._replace(netloc=f"{parts.hostname}:{port}"))
+
+class TrafficMonitor:
+    """Sends steady requests through the nginx front door to measure switch impact"""
+
+    def __init__(self, urls: List[str], interval: float = 0.05):
+        self.urls = urls
+        self.interval = interval
+        self.prober = HealthProbeEngine(urls, request_timeout=5)
+        self.samples: List[Dict[str, Any]] = []
+        self.stopped = asyncio.Event()
+
+    async def run(self):
+        while not self.stopped.is_set():
+            results = await asyncio.gather(*(asyncio.to_thread(self.prober.probe_once, url) for url in self.urls))
+            for ok, latency, error in results:
+                self.samples.append({"ok": ok, "latency": latency, "error": error})
+            try:
+                await asyncio.wait_for(self.stopped.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def summary(self) -> Dict[str, Any]:
+        latencies = [sample["latency"] for sample in self.samples]
+        return {
+            "requests": len(self.samples),
+            "errors": sum(1 for sample in self.samples if not sample["ok"]),
+            "latency_ms": {
+                "p50": round(percentile(latencies, 50) * 1000, 1),
+                "p95": round(percentile(latencies, 95) * 1000, 1),
+                "max": round(max(latencies, default=0) * 1000, 1)
+            }
+        }
+
+class ReleaseSwitcher:
+    def __init__(self, project_name: str, run_remote: Callable[[str], Awaitable[str]],
+                 release_index: ReleaseIndex, mode: Optional[str] = None,
+                 ports=DEFAULT_PORTS, drain_seconds: float = 10, warm_timeout: float = 60,
+                 app_url: Optional[str] = None, front_url: Optional[str] = None):
+        self.project_name = project_name
+        self.run_remote = run_remote
+        self.release_index = release_index
+        # Without an explicit mode, follow whatever brought the live release up,
+        # so a plain rollback after a zero-downtime deploy swaps back the same way
+        recorded = release_index.restart_mode
+        self.mode = mode or os.environ.get("MCP_RESTART_MODE") or recorded or "restart"
+        if self.mode not in RESTART_MODES:
+            raise ValueError(f"Unknown restart mode: {self.mode} (expected one of {', '.join(RESTART_MODES)})")
+        if recorded == "zero-downtime" and self.mode == "restart":
+            # nginx routes to a templated {project}@{port} unit whose RELEASE_DIR
+            # a plain restart would never touch
+            raise ValueError(f"{project_name} is running in zero-downtime mode; restart mode cannot take it over")
+        self.ports = ports
+        self.drain_seconds = float(os.environ.get("MCP_DRAIN_SECONDS", drain_seconds))
+        self.warm_timeout = warm_timeout
+        self.app_url = app_url
+        self.front_url = front_url
+        if self.mode == "zero-downtime":
+            # After a swap the app URL's own port may be the stopped instance, so
+            # traffic and post-switch probes have to go through nginx
+            if not front_url:
+                raise ValueError("Zero-downtime mode needs MCP_FRONT_URL, the nginx URL in front of the app ports")
+            if urllib.parse.urlsplit(front_url).port in ports:
+                raise ValueError(f"MCP_FRONT_URL ({front_url}) addresses an app port; point it at nginx")
+        self.upstream_conf = f"/etc/nginx/conf.d/{project_name}-upstream.conf"
+
+    def probe_url(self) -> Optional[str]:
+        """Base URL for post-switch probes and warm-up: nginx in zero-downtime mode"""
+        return self.front_url if self.mode == "zero-downtime" else self.app_url
+
+    def health_urls(self) -> List[str]:
+        """Post-switch health URLs: the front door plus the live instance on its own port"""
+        if self.mode != "zero-downtime":
+            return configured_health_urls(self.app_url)
+        urls = configured_health_urls(self.front_url)
+        if self.release_index.active_port:
+            urls += [with_port(url, self.release_index.active_port) for url in configured_health_urls(self.app_url)]
+        return urls
+
+    async def activate(self, release_dir: str, current_link: str) -> Dict[str, Any]:
+        """Point `current` at a release and bring it into service"""
+        if self.mode == "zero-downtime":
+            return await self.swap(release_dir, current_link)
+        start = time.monotonic()
+        await self.run_remote(f"ln -sfn {release_dir} {current_link}")
+        await self.run_remote(f"systemctl restart {self.project_name}")
+        await self.run_remote("systemctl restart nginx")
+        self.release_index.set_restart_mode("restart")
+        return {"mode": "restart", "duration": time.monotonic() - start}
+
+    async def swap(self, release_dir: str, current_link: str) -> Dict[str, Any]:
+        """Blue/green swap between the two app ports behind nginx"""
+        start = time.monotonic()
+        active_port = self.release_index.active_port
+        standby_port = self.ports[0] if active_port == self.ports[1] else self.ports[1]
+        unit = f"{self.project_name}@{standby_port}"
+        # The first swap takes over from the plain unit restart mode left running
+        active_unit = f"{self.project_name}@{active_port}" if active_port else self.project_name
+        print(f"🔁 Zero-downtime switch: {active_unit} -> port {standby_port}")
+
+        # The standby instance runs the release directly, so `current` only
+        # moves once it has proven healthy
+        await self.run_remote(f"echo RELEASE_DIR={release_dir} > /opt/{self.project_name}/run/{standby_port}.env")
+        await self.run_remote(f"systemctl restart {unit}")
+        standby_urls = [with_port(url, standby_port) for url in configured_health_urls(self.app_url)]
+        engine = HealthProbeEngine(standby_urls, timeout=self.warm_timeout)
+        warm = await engine.run()
+        engine.report(warm)
+        if not warm["healthy"]:
+            await self.run_remote(f"systemctl stop {unit}")
+            raise RuntimeError(f"Standby instance on port {standby_port} failed its health probes; live traffic untouched")
+
+        monitor = TrafficMonitor(configured_health_urls(self.front_url))
+        monitor_task = asyncio.ensure_future(monitor.run())
+        try:
+            await self.run_remote(f"ln -sfn {release_dir} {current_link}")
+            await self.run_remote(
+                f"echo 'upstream {self.project_name} {{ server 127.0.0.1:{standby_port}; }}' > {self.upstream_conf}.new && "
+                f"mv {self.upstream_conf}.new {self.upstream_conf}"
+            )
+            await self.run_remote("nginx -t && systemctl reload nginx")
+            # Old nginx workers finish their requests against the old instance before it stops
+            await asyncio.sleep(self.drain_seconds)
+            if active_port:
+                await self.run_remote(f"systemctl stop {active_unit}")
+            else:
+                # Keep the plain unit from grabbing the port back on the next boot
+                await self.run_remote(f"systemctl disable --now {active_unit}")
+        finally:
+            monitor.stopped.set()
+            await monitor_task
+
+        self.release_index.set_active_port(standby_port)
+        self.release_index.set_restart_mode("zero-downtime")
+        impact = monitor.summary()
+        print(f"   Switch impact: {impact['errors']}/{impact['requests']} requests failed, "
+              f"p95 {impact['latency_ms']['p95']}ms max {impact['latency_ms']['max']}ms")
+        return {"mode": "zero-downtime", "duration": time.monotonic() - start, "port": standby_port,
+                "warm_duration": warm["duration"], "impact": impact}
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Post-switch warm-up shared by the deploy and rollback orchestrators
+Replays the hot routes and API calls concurrently in rounds until p95
+latency stops moving, so route compilation, connection pools and ISR
+caches are primed before real users arrive
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, Any, List, Optional
+
+from health_probe import HealthProbeEngine, configured_app_url, percentile
+
+DEFAULT_WARMUP_ROUTES = ["/", "/api/health"]
+
+def configured_warmup_urls(base_url: Optional[str] = None) -> List[str]:
+    """Warm-up URLs from MCP_WARMUP_ROUTES (paths or full URLs), else the defaults"""
+    routes = os.environ.get("MCP_WARMUP_ROUTES")
+    routes = [route.strip() for route in routes.split(",") if route.strip()] if routes else DEFAULT_WARMUP_ROUTES
+    if all("://" in route for route in routes):
+        return routes
+    base_url = configured_app_url(base_url)
+    return [route if "://" in route else f"{base_url}{route}" for route in routes]
+
+class WarmupRunner:
+    def __init__(self, urls: List[str], concurrency: int = 4, stable_rounds: int = 3,
+                 tolerance: float = 0.15, min_band: float = 0.005, timeout: float = 120, request_timeout: float = 30):
+        self.urls = urls
+        self.concurrency = concurrency
+        self.stable_rounds = stable_rounds
+        self.tolerance = tolerance
+        self.min_band = min_band
+        self.timeout = timeout
+        self.prober = HealthProbeEngine(urls, request_timeout=request_timeout)
+
+    async def run_round(self) -> Dict[str, Any]:
+        """Hit every URL `concurrency` times at once"""
+        requests = [url for url in self.urls for _ in range(self.concurrency)]
+        results = await asyncio.gather(*(asyncio.to_thread(self.prober.probe_once, url) for url in requests))
+        latencies = [latency for _, latency, _ in results]
+        return {"p95": percentile(latencies, 95), "errors": sum(1 for ok, _, _ in results if not ok)}
+
+    def is_stable(self, history: List[float]) -> bool:
+        """p95 of the last few rounds sits within the tolerance band (never tighter than min_band seconds)"""
+        if len(history) < self.stable_rounds:
+            return False
+        recent = history[-self.stable_rounds:]
+        return max(recent) - min(recent) <= max(self.tolerance * max(recent), self.min_band)
+
+    async def run(self) -> Dict[str, Any]:
+        start = time.monotonic()
+        history: List[float] = []
+        errors = 0
+        warm = False
+        failed_rounds = 0
+        while time.monotonic() - start < self.timeout:
+            result = await self.run_round()
+            history.append(result["p95"])
+            errors += result["errors"]
+            if result["errors"] == 0 and self.is_stable(history):
+                warm = True
+                break
+            # Every request failing round after round means the app is down, not cold
+            failed_rounds = failed_rounds + 1 if result["errors"] == len(self.urls) * self.concurrency else 0
+            if failed_rounds >= self.stable_rounds:
+                break
+
+        return {
+            "warm": warm,
+            "time_to_warm": time.monotonic() - start,
+            "rounds": len(history),
+            "errors": errors,
+            "p95_ms_first": round(history[0] * 1000, 1) if history else 0.0,
+            "p95_ms_final": round(history[-1] * 1000, 1) if history else 0.0
+        }
+
+    def report(self, result: Dict[str, Any]):
+        status = "✅ Warm" if result["warm"] else "⚠️  Not stable"
+        print(f"   {status} after {result['time_to_warm']:.1f}s ({result['rounds']} rounds, {result['errors']} errors): "
+              f"p95 {result['p95_ms_first']}ms -> {result['p95_ms_final']}ms")
+
+async def warm_up_release(release_index, commit_sha: str, app_url: Optional[str] = None) -> Dict[str, Any]:
+    """Warm the live release and record its time-to-warm in the release index"""
+    print(f"🔥 Warming up release {commit_sha}")
+    runner = WarmupRunner(configured_warmup_urls(app_url))
+    result = await runner.run()
+    runner.report(result)
+    release_index.record_warmup(commit_sha, result)
+    return result
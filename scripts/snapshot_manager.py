@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Proxmox container snapshot lifecycle shared by the deploy and rollback orchestrators
+Snapshots are taken through the Proxmox MCP session without blocking other
+deploy stages, tracked in a local catalog, pruned by count, age and space,
+and every snapshot and restore is timed so the restore RTO is known
+
+The stock Proxmox MCP server has no snapshot functionality; this needs a
+server that exposes these tools, each taking the node and vmid:
+  create_snapshot(snapname, description), list_snapshots -> {"snapshots": [{"name", "size"}]},
+  delete_snapshot(snapname), rollback_snapshot(snapname), stop_container, start_container
+They are checked against tools/list before the first call
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Dict, Any, List, Optional
+
+from mcp_client import MCPClient
+from release_index import DEFAULT_INDEX_DIR
+
+DEFAULT_MAX_COUNT = 5
+DEFAULT_MAX_AGE_DAYS = 14
+REQUIRED_TOOLS = ("create_snapshot", "list_snapshots", "delete_snapshot",
+                  "rollback_snapshot", "stop_container", "start_container")
+
+class SnapshotError(Exception):
+    pass
+
+class SnapshotManager:
+    def __init__(self, proxmox_mcp: MCPClient, node: str, project_name: str, container_id: str,
+                 root: Optional[str] = None, max_count: Optional[int] = None,
+                 max_age_days: Optional[float] = None, max_bytes: Optional[int] = None):
+        self.proxmox_mcp = proxmox_mcp
+        self.node = node
+        self.container_id = container_id
+        self.root = root or os.environ.get("MCP_RELEASE_INDEX_DIR", DEFAULT_INDEX_DIR)
+        self.path = os.path.join(self.root, f"{project_name}-{container_id}.snapshots.json")
+        self.max_count = max_count or int(os.environ.get("MCP_SNAPSHOT_KEEP", DEFAULT_MAX_COUNT))
+        self.max_age_days = max_age_days or float(os.environ.get("MCP_SNAPSHOT_MAX_AGE_DAYS", DEFAULT_MAX_AGE_DAYS))
+        max_bytes = max_bytes or os.environ.get("MCP_SNAPSHOT_MAX_BYTES")
+        self.max_bytes = int(max_bytes) if max_bytes else None
+        self.catalog = self.load()
+        self.tools_checked = False
+
+    def load(self) -> Dict[str, Any]:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"snapshots": {}, "restores": []}
+
+    def save(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.catalog, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    async def call(self, tool: str, **arguments) -> Dict[str, Any]:
+        """Call a Proxmox MCP tool for this container without blocking the event loop"""
+        # Spawning the server and its handshake block, so they run on a worker thread
+        await asyncio.to_thread(self.proxmox_mcp.start)
+        if not self.tools_checked:
+            await self.check_tools()
+        future = self.proxmox_mcp.call_tool_async(tool, {"node": self.node, "vmid": self.container_id, **arguments})
+        response = await asyncio.wait_for(asyncio.wrap_future(future), self.proxmox_mcp.timeout)
+        if "error" in response:
+            raise SnapshotError(f"Proxmox {tool} failed: {response['error']}")
+        return response.get("result", {})
+
+    async def check_tools(self):
+        """Fail with the missing tool names instead of an opaque error mid-deploy"""
+        future = self.proxmox_mcp.request_async("tools/list", {})
+        response = await asyncio.wait_for(asyncio.wrap_future(future), self.proxmox_mcp.timeout)
+        if "error" in response:
+            raise SnapshotError(f"Proxmox tools/list failed: {response['error']}")
+        available = {tool.get("name") for tool in response.get("result", {}).get("tools", [])}
+        missing = [tool for tool in REQUIRED_TOOLS if tool not in available]
+        if missing:
+            raise SnapshotError(f"Proxmox MCP server lacks snapshot tools: {', '.join(missing)}")
+        self.tools_checked = True
+
+    def snapshots(self) -> List[Dict[str, Any]]:
+        """Catalogued snapshots, newest first"""
+        return sorted(self.catalog["snapshots"].values(), key=lambda s: s["created_at"], reverse=True)
+
+    async def create_async(self, description: str, release: Optional[str] = None) -> str:
+        # Container snapshots are copy-on-write on ZFS/LVM-thin storage, so each
+        # one only holds blocks changed since the previous snapshot
+        name = f"pre-deploy-{int(time.time())}"
+        start = time.monotonic()
+        await self.call("create_snapshot", snapname=name, description=description)
+        self.catalog["snapshots"][name] = {
+            "name": name,
+            "description": description,
+            "release": release,
+            "created_at": time.time(),
+            "duration": round(time.monotonic() - start, 3),
+            "size": None
+        }
+        self.save()
+        return name
+
+    async def refresh_async(self):
+        """Reconcile the catalog with Proxmox: record sizes, drop snapshots deleted elsewhere"""
+        result = await self.call("list_snapshots")
+        if not isinstance(result.get("snapshots"), list):
+            # Treating a malformed answer as "no snapshots" would wipe the catalog
+            raise SnapshotError(f"Proxmox list_snapshots returned no snapshot list: {result}")
+        listed = {snapshot["name"]: snapshot for snapshot in result["snapshots"]}
+        for name in list(self.catalog["snapshots"]):
+            if name not in listed:
+                del self.catalog["snapshots"][name]
+            elif listed[name].get("size") is not None:
+                self.catalog["snapshots"][name]["size"] = listed[name]["size"]
+        self.save()
+
+    def prune_candidates(self) -> List[str]:
+        """Snapshots beyond the count, age or space limits; the newest is always kept"""
+        snapshots = self.snapshots()
+        cutoff = time.time() - self.max_age_days * 86400
+        doomed = []
+        total = 0
+        for position, snapshot in enumerate(snapshots):
+            total += snapshot.get("size") or 0
+            if position == 0:
+                continue
+            if (position >= self.max_count or snapshot["created_at"] < cutoff
+                    or (self.max_bytes is not None and total > self.max_bytes)):
+                doomed.append(snapshot["name"])
+        return doomed
+
+    async def prune_async(self) -> List[str]:
+        pruned = []
+        for name in self.prune_candidates():
+            await self.call("delete_snapshot", snapname=name)
+            del self.catalog["snapshots"][name]
+            pruned.append(name)
+        if pruned:
+            self.save()
+        return pruned
+
+    async def restore_async(self, name: str) -> Dict[str, float]:
+        """Stop, roll back and restart the container, timing each step"""
+        timings = {}
+        start = time.monotonic()
+        for step, tool, arguments in [
+            ("stop", "stop_container", {}),
+            ("rollback", "rollback_snapshot", {"snapname": name}),
+            ("start", "start_container", {})
+        ]:
+            step_start = time.monotonic()
+            await self.call(tool, **arguments)
+            timings[step] = round(time.monotonic() - step_start, 3)
+        timings["total"] = round(time.monotonic() - start, 3)
+        self.catalog["restores"] = (self.catalog["restores"] + [{"snapshot": name, "restored_at": time.time(), **timings}])[-20:]
+        self.save()
+        return timings
+
+    def restore_rto(self) -> Optional[float]:
+        """Worst recorded restore time, the RTO to plan for"""
+        totals = [restore["total"] for restore in self.catalog["restores"]]
+        return max(totals) if totals else None
+
+    def create(self, description: str, release: Optional[str] = None) -> str:
+        return asyncio.run(self.create_async(description, release))
+
+    def prune(self) -> List[str]:
+        return asyncio.run(self.prune_async())
+
+    def restore(self, name: str) -> Dict[str, float]:
+        return asyncio.run(self.restore_async(name))
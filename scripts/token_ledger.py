@@ -2,40 +2,587 @@
 """
 WMACS Token Ledger - Track AI token usage per deployment phase
 Adapted from SDD Foundation for WMACS integration
+
+Entries are stored as an append-only JSON Lines log so logging is O(1).
+A sidecar index maps phase/branch and commit to byte offsets in the log;
+it is caught up lazily from the last indexed offset, so queries only parse
+the records they actually need. A per-(phase, branch) rollup of totals is
+kept alongside and validated against the log's size and mtime, so summaries
+and budget checks never touch individual records.
+
+Writes go through LedgerWriter, which buffers entries and appends them in
+one fsync'd write while holding an advisory lock on the ledger, so
+concurrent jobs never drop entries and a crash can at worst leave a torn
+trailing line that readers skip and the next writer truncates.
+
+Branch and commit are resolved by reading .git/HEAD and refs directly
+(memoized per process), or taken from WMACS_BRANCH / WMACS_COMMIT_SHA when
+set, so logging never forks git.
+
+`compact` moves entries older than a retention window into gzip-compressed
+per-month segments under .agent/ledger_segments, recording each month's
+phase/branch totals in a manifest so historical usage is answered without
+decompressing anything.
 """
+import gzip
+import itertools
 import json
 import os
 import sys
-from datetime import datetime
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; fall back to unlocked writes
+    fcntl = None
 
 LEDGER_DIR = ".agent"
-LEDGER_FILE = f"{LEDGER_DIR}/wmacs_token_ledger.json"
+LEDGER_FILE = f"{LEDGER_DIR}/wmacs_token_ledger.jsonl"
+INDEX_FILE = f"{LEDGER_DIR}/wmacs_token_ledger.idx.json"
+ROLLUP_FILE = f"{LEDGER_DIR}/wmacs_token_ledger.rollup.json"
+LOCK_FILE = f"{LEDGER_DIR}/wmacs_token_ledger.lock"
+SEGMENT_DIR = f"{LEDGER_DIR}/ledger_segments"
+SEGMENT_MANIFEST = f"{SEGMENT_DIR}/manifest.json"
+
+DEFAULT_RETENTION_DAYS = 30
+LEGACY_LEDGER_FILE = f"{LEDGER_DIR}/wmacs_token_ledger.json"
+
+INDEX_VERSION = 2
+ROLLUP_VERSION = 1
+
+BUDGET_WINDOWS = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
 
 def ensure_ledger_dir():
     """Create .agent directory if it doesn't exist"""
     os.makedirs(LEDGER_DIR, exist_ok=True)
 
+_git_head_cache = {}
+
+def find_git_dirs(start="."):
+    """Locate (git_dir, common_dir) for the repository containing start"""
+    path = os.path.abspath(start)
+    while True:
+        dot_git = os.path.join(path, ".git")
+        if os.path.isdir(dot_git):
+            return dot_git, dot_git
+        if os.path.isfile(dot_git):
+            # Worktrees and submodules point at their real git dir
+            with open(dot_git, "r", encoding="utf-8") as f:
+                content = f.read().strip()
+            if content.startswith("gitdir:"):
+                git_dir = os.path.normpath(os.path.join(path, content[len("gitdir:"):].strip()))
+                common_dir = git_dir
+                commondir_file = os.path.join(git_dir, "commondir")
+                if os.path.isfile(commondir_file):
+                    with open(commondir_file, "r", encoding="utf-8") as f:
+                        common_dir = os.path.normpath(os.path.join(git_dir, f.read().strip()))
+                return git_dir, common_dir
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None, None
+        path = parent
+
+def mtime_ns(path):
+    """Return a file's mtime in nanoseconds, or 0 if it is missing"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+def resolve_ref(common_dir, ref):
+    """Resolve a ref name to a SHA via loose refs, then packed-refs"""
+    loose = os.path.join(common_dir, ref)
+    if os.path.isfile(loose):
+        with open(loose, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    packed = os.path.join(common_dir, "packed-refs")
+    if os.path.isfile(packed):
+        with open(packed, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith(("#", "^")):
+                    continue
+                parts = line.split()
+                if len(parts) == 2 and parts[1] == ref:
+                    return parts[0]
+    return ""
+
+def read_git_head():
+    """Return (branch, sha) for HEAD, memoized until HEAD or its ref changes"""
+    git_dir, common_dir = find_git_dirs()
+    if not git_dir:
+        return "unknown", "unknown"
+
+    head_file = os.path.join(git_dir, "HEAD")
+    cached = _git_head_cache.get(git_dir)
+    if cached:
+        stamp, branch, sha, ref = cached
+        ref_stamp = (mtime_ns(os.path.join(common_dir, ref)), mtime_ns(os.path.join(common_dir, "packed-refs"))) if ref else ()
+        if stamp == (mtime_ns(head_file),) + ref_stamp:
+            return branch, sha
+
+    try:
+        with open(head_file, "r", encoding="utf-8") as f:
+            head = f.read().strip()
+    except OSError:
+        return "unknown", "unknown"
+
+    if head.startswith("ref:"):
+        ref = head[len("ref:"):].strip()
+        branch = ref[len("refs/heads/"):] if ref.startswith("refs/heads/") else ref
+        sha = resolve_ref(common_dir, ref) or "unknown"
+        stamp = (mtime_ns(head_file), mtime_ns(os.path.join(common_dir, ref)), mtime_ns(os.path.join(common_dir, "packed-refs")))
+    else:
+        # Detached HEAD: `git branch --show-current` reports nothing
+        ref, branch, sha = "", "", head
+        stamp = (mtime_ns(head_file),)
+
+    _git_head_cache[git_dir] = (stamp, branch, sha, ref)
+    return branch, sha
+
 def get_current_branch():
     """Get current git branch"""
+    override = os.environ.get("WMACS_BRANCH")
+    if override is not None:
+        return override
     try:
-        return os.popen("git branch --show-current").read().strip()
-    except:
+        return read_git_head()[0]
+    except Exception:
         return "unknown"
 
 def get_commit_sha():
     """Get current git commit SHA"""
+    override = os.environ.get("WMACS_COMMIT_SHA")
+    if override is not None:
+        return override[:8]
     try:
-        return os.popen("git rev-parse HEAD").read().strip()[:8]
-    except:
+        return read_git_head()[1][:8]
+    except Exception:
         return "unknown"
 
-def log_token_usage(phase, prompt_tokens=0, completion_tokens=0, operation=""):
-    """Log token usage for a specific WMACS phase"""
-    ensure_ledger_dir()
-    
+# flock is per open file description, so threads of one process need their
+# own lock; the depth is only touched by the thread holding _thread_lock
+_thread_lock = threading.RLock()
+_lock_depth = 0
+
+@contextmanager
+def ledger_lock():
+    """Hold an exclusive advisory lock on the ledger for the duration of the block
+
+    Re-entrant within a thread: nested blocks reuse the outer lock, since a
+    second flock on a new descriptor would deadlock against the first.
+    """
+    global _lock_depth
+    with _thread_lock:
+        if _lock_depth:
+            _lock_depth += 1
+            try:
+                yield
+            finally:
+                _lock_depth -= 1
+            return
+        ensure_ledger_dir()
+        with open(LOCK_FILE, "a") as lock:
+            if fcntl:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            _lock_depth = 1
+            try:
+                yield
+            finally:
+                _lock_depth = 0
+                if fcntl:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+def atomic_write(path, text):
+    """Write text to path via fsync'd temp file and atomic rename"""
+    tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, path)
+
+def index_key(phase, branch):
+    """Build the phase/branch key used by the ledger index"""
+    return f"{phase}\t{branch}"
+
+def entry_key(entry):
+    """Canonical form of an entry, used to spot entries that are already logged"""
+    return json.dumps(entry, sort_keys=True, separators=(",", ":"))
+
+def iter_archived_entries():
+    """Yield every entry moved into compressed segments, oldest month first"""
+    if not os.path.isdir(SEGMENT_DIR):
+        return
+    for name in sorted(os.listdir(SEGMENT_DIR)):
+        if name.endswith(".jsonl.gz"):
+            with gzip.open(os.path.join(SEGMENT_DIR, name), "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+
+def archived_entry_keys():
+    """Canonical forms of every entry already moved into compressed segments"""
+    return {entry_key(entry) for entry in iter_archived_entries()}
+
+def import_legacy_ledger(force=False):
+    """Import the legacy JSON array ledger into the JSONL log
+
+    Runs automatically once, when no JSONL log exists yet. A forced import
+    merges: legacy entries already in the log or its segments are skipped
+    and only the missing ones are appended, so nothing logged since the
+    first import is lost.
+    """
+    if not os.path.isfile(LEGACY_LEDGER_FILE):
+        return 0
+    if os.path.isfile(LEDGER_FILE) and not force:
+        return 0
+
+    with ledger_lock():
+        # Another process may have imported or logged while we waited
+        if os.path.isfile(LEDGER_FILE) and not force:
+            return 0
+
+        try:
+            with open(LEGACY_LEDGER_FILE, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Warning: Could not load legacy ledger: {e}")
+            return 0
+
+        if not os.path.isfile(LEDGER_FILE):
+            atomic_write(LEDGER_FILE, "".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in data))
+            # Offsets and totals from any earlier log are meaningless now
+            for derived_file in (INDEX_FILE, ROLLUP_FILE):
+                if os.path.isfile(derived_file):
+                    os.remove(derived_file)
+            print(f"✅ Imported {len(data)} entries from {LEGACY_LEDGER_FILE}")
+            return len(data)
+
+        repair_torn_tail()
+        known = archived_entry_keys()
+        known.update(entry_key(entry) for _, entry in iter_ledger())
+        missing = [entry for entry in data if entry_key(entry) not in known]
+        if missing:
+            # Appending keeps the log append-only, so the index and rollup catch up on their own
+            append_lines("".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in missing).encode("utf-8"))
+        print(f"✅ Imported {len(missing)} entries from {LEGACY_LEDGER_FILE} "
+              f"({len(data) - len(missing)} already in the ledger)")
+        return len(missing)
+
+def repair_torn_tail():
+    """Truncate a partial trailing line left behind by a crashed writer"""
+    size, _ = ledger_stat()
+    if not size:
+        return
+    with open(LEDGER_FILE, "rb+") as f:
+        end = size
+        while end > 0:
+            start = max(0, end - 4096)
+            f.seek(start)
+            chunk = f.read(end - start)
+            newline = chunk.rfind(b"\n")
+            if newline != -1:
+                end = start + newline + 1
+                break
+            end = start
+        if end != size:
+            f.truncate(end)
+
+def append_lines(data):
+    """Append encoded lines to the ledger log and fsync them"""
+    fd = os.open(LEDGER_FILE, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def iter_ledger(start=0, progress=None):
+    """Yield (offset, entry) pairs from the ledger log starting at a byte offset
+
+    When a progress dict is given, progress["end"] tracks the offset just past
+    the last complete line read, so callers can record exactly how far this
+    pass got even if the log grows while they iterate.
+    """
+    if progress is not None:
+        progress["end"] = start
+    if not os.path.isfile(LEDGER_FILE):
+        return
+    with open(LEDGER_FILE, "rb") as f:
+        f.seek(start)
+        offset = start
+        for raw in f:
+            line_offset = offset
+            offset += len(raw)
+            if not raw.endswith(b"\n"):
+                # Torn trailing write; stop before it so it is re-read later
+                break
+            if progress is not None:
+                progress["end"] = offset
+            try:
+                yield line_offset, json.loads(raw)
+            except ValueError:
+                continue
+
+def empty_index():
+    """Return an index that covers no ledger bytes"""
+    return {"version": INDEX_VERSION, "size": 0, "phase_branch": {}, "timestamps": {}, "commit": {}}
+
+def save_index(index):
+    """Persist the ledger index atomically"""
+    atomic_write(INDEX_FILE, json.dumps(index, separators=(",", ":")))
+
+def load_index():
+    """Load the ledger index, indexing any entries appended since the last call"""
+    import_legacy_ledger()
+    index = None
+    if os.path.isfile(INDEX_FILE):
+        try:
+            with open(INDEX_FILE, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except Exception:
+            index = None
+
+    size = os.path.getsize(LEDGER_FILE) if os.path.isfile(LEDGER_FILE) else 0
+    if not index or index.get("version") != INDEX_VERSION or index.get("size", 0) > size:
+        index = empty_index()
+
+    if index["size"] == size:
+        return index
+
+    progress = {}
+    for offset, entry in iter_ledger(index["size"], progress):
+        add_to_index(index, offset, entry)
+
+    if progress["end"] != index["size"]:
+        index["size"] = progress["end"]
+        try:
+            save_index(index)
+        except OSError as e:
+            print(f"Warning: Could not save ledger index: {e}")
+
+    return index
+
+def add_to_index(index, offset, entry):
+    """Record an entry's offset under its phase/branch and commit keys"""
+    key = index_key(entry.get("phase"), entry.get("branch"))
+    index["phase_branch"].setdefault(key, []).append(offset)
+    # Kept parallel to the offsets so time windows are answered from the index
+    index["timestamps"].setdefault(key, []).append(entry.get("timestamp", ""))
+    index["commit"].setdefault(entry.get("commit_sha", "unknown"), []).append(offset)
+
+def read_entries(offsets):
+    """Read ledger entries at the given byte offsets"""
+    entries = []
+    if not offsets:
+        return entries
+    with open(LEDGER_FILE, "rb") as f:
+        for offset in sorted(offsets):
+            f.seek(offset)
+            try:
+                entries.append(json.loads(f.readline()))
+            except ValueError:
+                continue
+    return entries
+
+def matching_keys(index, phase=None, branch=None):
+    """Phase/branch index keys matching the given filters"""
+    for key in index["phase_branch"]:
+        key_phase, key_branch = key.split("\t", 1)
+        if phase is not None and key_phase != phase:
+            continue
+        if branch is not None and key_branch != branch:
+            continue
+        yield key
+
+def lookup_offsets(index, phase=None, branch=None, commit_sha=None):
+    """Resolve entry offsets matching phase/branch/commit from the index"""
+    offsets = None
+    if phase is not None or branch is not None:
+        offsets = set()
+        for key in matching_keys(index, phase, branch):
+            offsets.update(index["phase_branch"][key])
+    if commit_sha is not None:
+        commit_offsets = set(index["commit"].get(commit_sha, []))
+        offsets = commit_offsets if offsets is None else offsets & commit_offsets
+    if offsets is None:
+        offsets = {o for key_offsets in index["phase_branch"].values() for o in key_offsets}
+    return offsets
+
+def ledger_stat():
+    """Return (size, mtime_ns) of the ledger log, or (0, 0) if it is missing"""
+    try:
+        st = os.stat(LEDGER_FILE)
+    except FileNotFoundError:
+        return 0, 0
+    return st.st_size, st.st_mtime_ns
+
+def empty_rollup():
+    """Return a rollup that covers no ledger bytes"""
+    return {"version": ROLLUP_VERSION, "size": 0, "mtime_ns": 0, "totals": {}}
+
+def save_rollup(rollup):
+    """Persist the phase/branch rollup atomically"""
+    atomic_write(ROLLUP_FILE, json.dumps(rollup, separators=(",", ":")))
+
+def add_to_rollup(rollup, entry):
+    """Fold a single entry into the phase/branch totals"""
+    key = index_key(entry.get("phase"), entry.get("branch"))
+    totals = rollup["totals"].setdefault(key, {"total_tokens": 0, "total_credits": 0.0, "operations": 0})
+    totals["total_tokens"] += entry.get("total_tokens", 0)
+    totals["total_credits"] += entry.get("estimated_credits", 0)
+    totals["operations"] += 1
+
+def load_rollup():
+    """Load the phase/branch rollup, folding in entries appended since it was saved"""
+    import_legacy_ledger()
+    rollup = None
+    if os.path.isfile(ROLLUP_FILE):
+        try:
+            with open(ROLLUP_FILE, "r", encoding="utf-8") as f:
+                rollup = json.load(f)
+        except Exception:
+            rollup = None
+
+    size, mtime_ns = ledger_stat()
+    if not rollup or rollup.get("version") != ROLLUP_VERSION:
+        rollup = empty_rollup()
+    elif rollup["size"] == size and rollup["mtime_ns"] == mtime_ns:
+        return rollup
+    elif rollup["size"] >= size:
+        # Same or shorter log with a different mtime means it was rewritten
+        rollup = empty_rollup()
+
+    # The log is append-only, so only bytes past the saved size need folding in
+    progress = {}
+    for _, entry in iter_ledger(rollup["size"], progress):
+        add_to_rollup(rollup, entry)
+    rollup["size"] = progress["end"]
+    rollup["mtime_ns"] = mtime_ns if rollup["size"] == size else 0
+
+    try:
+        save_rollup(rollup)
+    except OSError as e:
+        print(f"Warning: Could not save ledger rollup: {e}")
+    return rollup
+
+def rollup_totals(rollup, phase=None, branch=None, manifest=None, month=None):
+    """Sum hot rollup and archived segment totals for matching phase/branch keys"""
+    sources = [] if month else [rollup["totals"]]
+    if manifest:
+        sources.extend(
+            segment["totals"] for segment_month, segment in manifest["months"].items()
+            if month is None or segment_month == month
+        )
+
+    result = {"total_tokens": 0, "total_credits": 0.0, "operations": 0}
+    for source in sources:
+        for key, totals in source.items():
+            key_phase, key_branch = key.split("\t", 1)
+            if phase is not None and key_phase != phase:
+                continue
+            if branch is not None and key_branch != branch:
+                continue
+            for field in result:
+                result[field] += totals[field]
+    result["total_credits"] = round(result["total_credits"], 3)
+    return result
+
+def load_segment_manifest():
+    """Load per-month totals for archived ledger segments"""
+    if not os.path.isfile(SEGMENT_MANIFEST):
+        return {"months": {}}
+    try:
+        with open(SEGMENT_MANIFEST, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Warning: Could not load segment manifest: {e}")
+        return {"months": {}}
+
+def segment_path(month):
+    """Path of the compressed segment holding a month's archived entries"""
+    return f"{SEGMENT_DIR}/{month}.jsonl.gz"
+
+def write_segment(month, entries):
+    """Merge entries into a month's compressed segment via atomic rename"""
+    path = segment_path(month)
+    existing = b""
+    if os.path.isfile(path):
+        with gzip.open(path, "rb") as f:
+            existing = f.read()
+    data = existing + "".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in entries).encode("utf-8")
+
+    tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_file, "wb") as raw:
+        with gzip.GzipFile(filename=os.path.basename(path), mode="wb", fileobj=raw) as f:
+            f.write(data)
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_file, path)
+
+def compact_ledger(retention_days=DEFAULT_RETENTION_DAYS):
+    """Archive entries older than the retention window into monthly segments"""
+    if retention_days < 1:
+        # Hour/day budget windows read the hot log only
+        raise ValueError("retention_days must be at least 1")
+
+    cutoff = (datetime.utcnow() - timedelta(days=retention_days)).isoformat()
+    with ledger_lock():
+        import_legacy_ledger()
+        repair_torn_tail()
+
+        archived = {}
+        hot_lines = []
+        for _, entry in iter_ledger():
+            timestamp = entry.get("timestamp", "")
+            if timestamp and timestamp < cutoff:
+                archived.setdefault(timestamp[:7], []).append(entry)
+            else:
+                hot_lines.append(json.dumps(entry, separators=(",", ":")) + "\n")
+
+        if not archived:
+            return {}
+
+        os.makedirs(SEGMENT_DIR, exist_ok=True)
+        manifest = load_segment_manifest()
+        for month, entries in sorted(archived.items()):
+            write_segment(month, entries)
+            segment = manifest["months"].setdefault(month, {"entries": 0, "totals": {}})
+            rollup = {"totals": segment["totals"]}
+            for entry in entries:
+                add_to_rollup(rollup, entry)
+            timestamps = [entry["timestamp"] for entry in entries]
+            segment["entries"] += len(entries)
+            segment["first_timestamp"] = min(timestamps + [segment.get("first_timestamp") or timestamps[0]])
+            segment["last_timestamp"] = max(timestamps + [segment.get("last_timestamp") or timestamps[0]])
+        # Segments and manifest land before the hot log shrinks, so a crash
+        # here can only double-count, never lose, archived usage
+        atomic_write(SEGMENT_MANIFEST, json.dumps(manifest, indent=2))
+        atomic_write(LEDGER_FILE, "".join(hot_lines))
+
+        for derived_file in (INDEX_FILE, ROLLUP_FILE):
+            if os.path.isfile(derived_file):
+                os.remove(derived_file)
+        load_rollup()
+
+    return {month: len(entries) for month, entries in archived.items()}
+
+def build_entry(phase, prompt_tokens=0, completion_tokens=0, operation=""):
+    """Build a ledger entry for a specific WMACS phase"""
     total_tokens = int(prompt_tokens) + int(completion_tokens)
     estimated_credits = total_tokens / 1000.0  # Rough conversion: 1000 tokens = 1 credit
-    
+
     entry = {
         "timestamp": datetime.utcnow().isoformat(),
         "phase": phase,  # build, deploy, test, rollback
@@ -47,49 +594,98 @@ def log_token_usage(phase, prompt_tokens=0, completion_tokens=0, operation=""):
         "total_tokens": total_tokens,
         "estimated_credits": round(estimated_credits, 3)
     }
-    
-    # Load existing data
-    data = []
-    if os.path.isfile(LEDGER_FILE):
-        try:
-            with open(LEDGER_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        except Exception as e:
-            print(f"Warning: Could not load existing ledger: {e}")
-            data = []
-    
-    # Append new entry
-    data.append(entry)
-    
-    # Write back to file
+    return entry
+
+class LedgerWriter:
+    """Buffered, lock-protected writer for the token ledger
+
+    Use as a context manager to log many operations with a single durable
+    write:
+
+        with LedgerWriter() as ledger:
+            ledger.log("deploy", 120, 40, "snapshot")
+            ledger.log("deploy", 80, 20, "migrate")
+    """
+
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+        self.buffer = []
+
+    def log(self, phase, prompt_tokens=0, completion_tokens=0, operation=""):
+        """Buffer a usage entry, flushing once the batch is full"""
+        entry = build_entry(phase, prompt_tokens, completion_tokens, operation)
+        self.buffer.append(entry)
+        if self.batch_size and len(self.buffer) >= self.batch_size:
+            self.flush()
+        return entry
+
+    def flush(self):
+        """Durably append all buffered entries and update the rollup"""
+        if not self.buffer:
+            return 0
+        data = "".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in self.buffer)
+        with ledger_lock():
+            import_legacy_ledger()
+            repair_torn_tail()
+            append_lines(data.encode("utf-8"))
+            load_rollup()
+        count = len(self.buffer)
+        self.buffer = []
+        return count
+
+    def close(self):
+        """Flush any remaining entries"""
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+def log_token_usage(phase, prompt_tokens=0, completion_tokens=0, operation=""):
+    """Log token usage for a specific WMACS phase"""
     try:
-        with open(LEDGER_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
+        with LedgerWriter() as ledger:
+            entry = ledger.log(phase, prompt_tokens, completion_tokens, operation)
         print(f"✅ WMACS Usage Logged: {phase} - {entry['total_tokens']} tokens (~{entry['estimated_credits']} credits)")
     except Exception as e:
         print(f"❌ Failed to log token usage: {e}")
 
-def get_phase_usage(phase, branch=None):
-    """Get token usage summary for a specific phase"""
-    if not os.path.isfile(LEDGER_FILE):
-        return {"total_tokens": 0, "operations": 0}
-    
+def get_phase_usage(phase, branch=None, commit_sha=None, include_entries=True, month=None):
+    """Get token usage summary for a specific phase
+
+    Totals include archived segments unless filtering by commit, which is
+    only indexed for the hot log; entries always come from the hot log.
+    Pass month ("YYYY-MM") to restrict the totals to a single month.
+    """
+    if commit_sha is None and not include_entries and month is None:
+        # Totals alone come straight from the rollup and segment manifest
+        try:
+            return rollup_totals(load_rollup(), phase, branch, load_segment_manifest())
+        except Exception:
+            return {"total_tokens": 0, "total_credits": 0, "operations": 0}
+
     try:
-        with open(LEDGER_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except:
+        index = load_index()
+    except Exception:
         return {"total_tokens": 0, "operations": 0}
-    
-    filtered_data = [
-        entry for entry in data 
-        if entry.get("phase") == phase and 
-        (branch is None or entry.get("branch") == branch)
-    ]
-    
+
+    filtered_data = read_entries(lookup_offsets(index, phase, branch, commit_sha))
+    if month is not None:
+        filtered_data = [entry for entry in filtered_data if entry.get("timestamp", "").startswith(month)]
+
     total_tokens = sum(entry.get("total_tokens", 0) for entry in filtered_data)
     total_credits = sum(entry.get("estimated_credits", 0) for entry in filtered_data)
     operations = len(filtered_data)
-    
+
+    if commit_sha is None:
+        archived = rollup_totals({"totals": {}}, phase, branch, load_segment_manifest(), month)
+        total_tokens += archived["total_tokens"]
+        total_credits += archived["total_credits"]
+        operations += archived["operations"]
+
     return {
         "total_tokens": total_tokens,
         "total_credits": round(total_credits, 3),
@@ -97,74 +693,250 @@ def get_phase_usage(phase, branch=None):
         "entries": filtered_data
     }
 
-def check_phase_budget(phase, budget_limit):
-    """Check if current phase is within token budget"""
+def get_window_usage(phase, branch=None, since=None):
+    """Get token totals for a phase recorded at or after `since` (UTC)"""
+    result = {"total_tokens": 0, "total_credits": 0.0, "operations": 0}
+    try:
+        index = load_index()
+    except Exception:
+        return result
+
+    # Append order is not timestamp order (LedgerWriter stamps entries at log()
+    # but appends them at flush()), so the window is picked from the indexed
+    # timestamps and only entries inside it are read
+    cutoff = since.isoformat() if since else ""
+    offsets = []
+    for key in matching_keys(index, phase, branch):
+        offsets.extend(offset for offset, timestamp in zip(index["phase_branch"][key], index["timestamps"][key])
+                       if timestamp >= cutoff)
+    if not offsets or not os.path.isfile(LEDGER_FILE):
+        return result
+
+    with open(LEDGER_FILE, "rb") as f:
+        for offset in sorted(offsets):
+            f.seek(offset)
+            try:
+                entry = json.loads(f.readline())
+            except ValueError:
+                continue
+            result["total_tokens"] += entry.get("total_tokens", 0)
+            result["total_credits"] += entry.get("estimated_credits", 0)
+            result["operations"] += 1
+
+    result["total_credits"] = round(result["total_credits"], 3)
+    return result
+
+def check_phase_budget(phase, budget_limit, window=None):
+    """Check if current phase is within token budget
+
+    window may be None (lifetime of the branch), "hour", "day" or "commit".
+    """
     current_branch = get_current_branch()
-    usage = get_phase_usage(phase, current_branch)
-    
+    if window is None:
+        usage = get_phase_usage(phase, current_branch, include_entries=False)
+    elif window == "commit":
+        usage = get_phase_usage(phase, current_branch, commit_sha=get_commit_sha(), include_entries=False)
+    elif window in BUDGET_WINDOWS:
+        usage = get_window_usage(phase, current_branch, datetime.utcnow() - BUDGET_WINDOWS[window])
+    else:
+        raise ValueError(f"Unknown budget window: {window}")
+    scope = f"per {window}" if window else "lifetime"
+
     if usage["total_tokens"] > budget_limit:
         print(f"⚠️  WMACS Token Budget Exceeded:")
-        print(f"   Phase: {phase}")
+        print(f"   Phase: {phase} ({scope})")
         print(f"   Used: {usage['total_tokens']} tokens")
         print(f"   Budget: {budget_limit} tokens")
         print(f"   Overage: {usage['total_tokens'] - budget_limit} tokens")
         return False
-    
+
     remaining = budget_limit - usage["total_tokens"]
-    print(f"✅ WMACS Token Budget OK: {remaining} tokens remaining for {phase}")
+    print(f"✅ WMACS Token Budget OK: {remaining} tokens remaining for {phase} ({scope})")
     return True
 
+class StreamingStats:
+    """Single-pass aggregator for ledger analytics
+
+    Token counts are kept as a value histogram rather than a list, so memory
+    grows with the number of distinct counts, not the number of entries.
+    """
+
+    PERCENTILES = (50, 90, 95, 99)
+
+    def __init__(self, now=None):
+        self.now = now or datetime.utcnow()
+        self.hour_cutoff = (self.now - BUDGET_WINDOWS["hour"]).isoformat()
+        self.day_cutoff = (self.now - BUDGET_WINDOWS["day"]).isoformat()
+        self.histogram = Counter()
+        self.operations = 0
+        self.total_tokens = 0
+        self.total_credits = 0.0
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.last_hour_tokens = 0
+        self.last_day_tokens = 0
+        self.by_phase = Counter()
+
+    def add(self, entry):
+        """Fold one ledger entry into the running statistics"""
+        tokens = entry.get("total_tokens", 0)
+        timestamp = entry.get("timestamp", "")
+        self.histogram[tokens] += 1
+        self.operations += 1
+        self.total_tokens += tokens
+        self.total_credits += entry.get("estimated_credits", 0)
+        self.by_phase[entry.get("phase")] += tokens
+        if timestamp:
+            if self.first_timestamp is None or timestamp < self.first_timestamp:
+                self.first_timestamp = timestamp
+            if self.last_timestamp is None or timestamp > self.last_timestamp:
+                self.last_timestamp = timestamp
+            if timestamp >= self.hour_cutoff:
+                self.last_hour_tokens += tokens
+            if timestamp >= self.day_cutoff:
+                self.last_day_tokens += tokens
+
+    def percentile(self, pct):
+        """Nearest-rank percentile of tokens per operation"""
+        if not self.operations:
+            return 0
+        rank = max(1, -(-pct * self.operations // 100))
+        seen = 0
+        for value in sorted(self.histogram):
+            seen += self.histogram[value]
+            if seen >= rank:
+                return value
+        return 0
+
+    def burn_rate(self):
+        """Average tokens per hour between the first and last entry"""
+        if not self.first_timestamp or self.first_timestamp == self.last_timestamp:
+            return float(self.total_tokens)
+        span = datetime.fromisoformat(self.last_timestamp) - datetime.fromisoformat(self.first_timestamp)
+        hours = max(span.total_seconds() / 3600.0, 1 / 60.0)
+        return self.total_tokens / hours
+
+    def to_dict(self):
+        """Render the statistics as a JSON-serializable report"""
+        return {
+            "generated_at": self.now.isoformat(),
+            "operations": self.operations,
+            "total_tokens": self.total_tokens,
+            "total_credits": round(self.total_credits, 3),
+            "tokens_per_operation": {
+                "mean": round(self.total_tokens / self.operations, 2) if self.operations else 0,
+                "max": max(self.histogram) if self.histogram else 0,
+                **{f"p{pct}": self.percentile(pct) for pct in self.PERCENTILES}
+            },
+            "burn_rate": {
+                "tokens_per_hour": round(self.burn_rate(), 2),
+                "last_hour_tokens": self.last_hour_tokens,
+                "last_day_tokens": self.last_day_tokens
+            },
+            "tokens_by_phase": dict(self.by_phase),
+            "first_timestamp": self.first_timestamp,
+            "last_timestamp": self.last_timestamp
+        }
+
+def build_report(phase=None, branch=None, include_archived=True):
+    """Stream the archived segments and the ledger once and return usage analytics"""
+    stats = StreamingStats()
+    entries = (entry for _, entry in iter_ledger())
+    if include_archived:
+        entries = itertools.chain(iter_archived_entries(), entries)
+    for entry in entries:
+        if phase is not None and entry.get("phase") != phase:
+            continue
+        if branch is not None and entry.get("branch") != branch:
+            continue
+        stats.add(entry)
+    report = stats.to_dict()
+    report["phase"] = phase
+    report["branch"] = branch
+    report["scope"] = "ledger and archived segments" if include_archived else "ledger only (archived segments skipped)"
+    return report
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Usage: python token_ledger.py <command> [args]")
         print("Commands:")
         print("  log <phase> <prompt_tokens> <completion_tokens> [operation]")
-        print("  check <phase> <budget_limit>")
+        print("  check <phase> <budget_limit> [hour|day|commit]")
         print("  summary [phase] [branch]")
+        print("  report [phase] [branch] [--hot] - Emit usage analytics as JSON (--hot skips archived segments)")
+        print("  import - Import the legacy JSON ledger into the JSONL log")
+        print(f"  compact [retention_days] - Archive entries older than retention (default {DEFAULT_RETENTION_DAYS})")
         sys.exit(1)
-    
+
     command = sys.argv[1]
-    
+
     if command == "log":
         if len(sys.argv) < 5:
             print("Usage: python token_ledger.py log <phase> <prompt_tokens> <completion_tokens> [operation]")
             sys.exit(1)
-        
+
         phase = sys.argv[2]
         prompt_tokens = int(sys.argv[3])
         completion_tokens = int(sys.argv[4])
         operation = sys.argv[5] if len(sys.argv) > 5 else ""
-        
+
         log_token_usage(phase, prompt_tokens, completion_tokens, operation)
-    
+
     elif command == "check":
         if len(sys.argv) < 4:
-            print("Usage: python token_ledger.py check <phase> <budget_limit>")
+            print("Usage: python token_ledger.py check <phase> <budget_limit> [hour|day|commit]")
             sys.exit(1)
-        
+
         phase = sys.argv[2]
         budget_limit = int(sys.argv[3])
-        
-        if not check_phase_budget(phase, budget_limit):
+        window = sys.argv[4] if len(sys.argv) > 4 else None
+
+        if window is not None and window != "commit" and window not in BUDGET_WINDOWS:
+            print(f"Unknown budget window: {window}")
             sys.exit(1)
-    
+
+        if not check_phase_budget(phase, budget_limit, window):
+            sys.exit(1)
+
+    elif command == "report":
+        args = [arg for arg in sys.argv[2:] if arg != "--hot"]
+        phase = args[0] if args else None
+        branch = args[1] if len(args) > 1 else None
+
+        import_legacy_ledger()
+        print(json.dumps(build_report(phase, branch, include_archived="--hot" not in sys.argv), indent=2))
+
     elif command == "summary":
         phase = sys.argv[2] if len(sys.argv) > 2 else None
         branch = sys.argv[3] if len(sys.argv) > 3 else None
-        
+
         if phase:
-            usage = get_phase_usage(phase, branch)
+            usage = get_phase_usage(phase, branch, include_entries=False)
             print(f"📊 WMACS Token Usage Summary - {phase}")
             print(f"   Total Tokens: {usage['total_tokens']}")
             print(f"   Operations: {usage['operations']}")
         else:
-            # Show all phases
+            # Show all phases from a single rollup and manifest load
+            rollup = load_rollup()
+            manifest = load_segment_manifest()
             phases = ["build", "deploy", "test", "rollback"]
             for p in phases:
-                usage = get_phase_usage(p, branch)
+                usage = rollup_totals(rollup, p, branch, manifest)
                 if usage["operations"] > 0:
                     print(f"📊 {p.upper()}: {usage['total_tokens']} tokens (~{usage['total_credits']} credits, {usage['operations']} ops)")
-    
+
+    elif command == "import":
+        ensure_ledger_dir()
+        import_legacy_ledger(force=True)
+
+    elif command == "compact":
+        retention_days = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_RETENTION_DAYS
+        archived = compact_ledger(retention_days)
+        if not archived:
+            print(f"✅ Nothing older than {retention_days} days to compact")
+        for month, count in sorted(archived.items()):
+            print(f"📦 Archived {count} entries to {segment_path(month)}")
+
     else:
         print(f"Unknown command: {command}")
         sys.exit(1)
@@ -2,138 +2,766 @@
 """
 WMACS Diff-Scoped Analyzer - Only analyze changed files for token efficiency
 """
+import fnmatch
+import hashlib
 import json
 import os
+import re
 import sys
 import subprocess
+import time
+from collections import deque
+from datetime import datetime, timezone
 from pathlib import Path
 
-def get_git_diff_files(base_branch="main"):
-    """Get list of files changed compared to base branch"""
-    try:
-        cmd = f"git diff --name-only {base_branch}..HEAD"
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        if result.returncode == 0:
-            files = [f.strip() for f in result.stdout.split('\n') if f.strip()]
-            return files
+STATUS_NAMES = {
+    "A": "added",
+    "C": "copied",
+    "D": "deleted",
+    "M": "modified",
+    "R": "renamed",
+    "T": "type_changed",
+    "U": "unmerged"
+}
+
+CHARS_PER_TOKEN = 4
+CONTEXT_LINES = 3
+MAX_ENCLOSING_LINES = 200
+HUNK_HEADER = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@")
+DECLARATION_PATTERN = re.compile(
+    r"^(?:export\s+)?(?:default\s+)?(?:async\s+)?"
+    r"(?:function\*?|class|const|let|var|interface|type|enum|def)\s+(\w+)"
+)
+
+GRAPH_ROOTS = ["pages", "components", "src", "middleware.ts"]
+GRAPH_EXTENSIONS = ('.ts', '.tsx', '.js', '.jsx')
+GRAPH_CACHE_FILE = ".agent/wmacs_import_graph.json"
+DEFAULT_PATH_ALIASES = {"@/": "src/"}
+IMPORT_PATTERN = re.compile(
+    r"""(?:import|export)\s[^'";]*?from\s*['"]([^'"]+)['"]"""
+    r"""|import\s*\(?\s*['"]([^'"]+)['"]"""
+    r"""|require\(\s*['"]([^'"]+)['"]\s*\)"""
+)
+
+def parse_diff_output(output):
+    """Parse `git diff -z --raw --numstat` into one record per changed path"""
+    tokens = output.split("\0")
+    records = {}
+    order = []
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token.startswith(":"):
+            # Raw entry: ":<mode> <mode> <sha> <sha> <status>" then path(s)
+            status = token.split()[-1]
+            if status[0] in "RC":
+                old_path, path = tokens[i + 1], tokens[i + 2]
+                i += 3
+            else:
+                old_path, path = None, tokens[i + 1]
+                i += 2
+            records[path] = {
+                "path": path,
+                "status": STATUS_NAMES.get(status[0], status[0]),
+                "old_path": old_path,
+                "added": 0,
+                "removed": 0,
+                "binary": False
+            }
+            order.append(path)
+        elif token.count("\t") == 2:
+            # Numstat entry; renames leave the path empty and append old and new paths
+            added, removed, path = token.split("\t")
+            if not path:
+                path = tokens[i + 2]
+                i += 3
+            else:
+                i += 1
+            record = records.get(path)
+            if record is not None:
+                record["binary"] = added == "-"
+                record["added"] = 0 if added == "-" else int(added)
+                record["removed"] = 0 if removed == "-" else int(removed)
         else:
-            print(f"Warning: Could not get git diff: {result.stderr}")
-            return []
+            i += 1
+    return [records[path] for path in order]
+
+def run_git_diff(args):
+    """Run one git diff and return structured change records"""
+    cmd = ["git", "diff", "-z", "--raw", "--numstat", "-M", *args]
+    try:
+        result = subprocess.run(cmd, capture_output=True)
     except Exception as e:
         print(f"Error getting git diff: {e}")
         return []
+    if result.returncode != 0:
+        print(f"Warning: Could not get git diff: {result.stderr.decode(errors='replace')}")
+        return []
+    # Paths are raw bytes under -z; fsdecode keeps non-UTF-8 names round-trippable
+    return parse_diff_output(os.fsdecode(result.stdout))
+
+def get_git_diff_files(base_branch="main"):
+    """Get change records for files changed compared to base branch"""
+    return run_git_diff([f"{base_branch}..HEAD"])
 
 def get_staged_files():
-    """Get list of staged files"""
-    try:
-        cmd = "git diff --cached --name-only"
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        if result.returncode == 0:
-            files = [f.strip() for f in result.stdout.split('\n') if f.strip()]
-            return files
-        else:
-            return []
-    except Exception as e:
-        print(f"Error getting staged files: {e}")
-        return []
+    """Get change records for staged files"""
+    return run_git_diff(["--cached"])
 
-def filter_relevant_files(files, extensions=None):
-    """Filter files by relevant extensions for AI analysis"""
+def filter_relevant_files(changes, extensions=None):
+    """Filter change records by relevant extensions for AI analysis, dropping deletions"""
     if extensions is None:
         extensions = ['.js', '.ts', '.tsx', '.jsx', '.py', '.json', '.yml', '.yaml', '.md']
+    extensions = tuple(extensions)
+    
+    return [change for change in changes
+            if change["status"] != "deleted" and change["path"].endswith(extensions)]
+
+def list_graph_files():
+    """Blob SHA of every source file under the graph roots, from the index"""
+    result = subprocess.run(["git", "ls-files", "-s", "-z", "--", *GRAPH_ROOTS], capture_output=True)
+    files = {}
+    for entry in os.fsdecode(result.stdout).split("\0"):
+        if not entry:
+            continue
+        meta, path = entry.split("\t", 1)
+        if path.endswith(GRAPH_EXTENSIONS):
+            files[path] = meta.split()[1]
+    return files
+
+def read_blobs(names):
+    """Read many blobs (SHAs or rev:path names) through one `git cat-file --batch` process"""
+    if not names:
+        return {}
+    result = subprocess.run(["git", "cat-file", "--batch"], input=os.fsencode("\n".join(names)), capture_output=True)
+    output = result.stdout
+    blobs = {}
+    offset = 0
+    # Responses come back in request order
+    for name in names:
+        if offset >= len(output):
+            break
+        header_end = output.index(b"\n", offset)
+        header = output[offset:header_end].decode(errors="replace").split()
+        offset = header_end + 1
+        if len(header) < 3 or header[-1] == "missing":
+            continue
+        size = int(header[2])
+        blobs[name] = output[offset:offset + size].decode("utf-8", errors="replace")
+        offset += size + 1
+    return blobs
+
+def load_path_aliases():
+    """Import aliases from tsconfig.json compilerOptions.paths, e.g. @/* -> src/*"""
+    try:
+        with open("tsconfig.json") as f:
+            paths = json.load(f)["compilerOptions"]["paths"]
+    except (OSError, ValueError, KeyError):
+        return DEFAULT_PATH_ALIASES
+    aliases = {}
+    for alias, targets in paths.items():
+        if alias.endswith("/*") and targets:
+            aliases[alias[:-1]] = os.path.normpath(targets[0][:-1]) + "/"
+    return aliases or DEFAULT_PATH_ALIASES
+
+def resolve_import(spec, importer, files, aliases):
+    """Resolve an import specifier to a known file, or None for packages"""
+    if spec.startswith("."):
+        base = os.path.normpath(os.path.join(os.path.dirname(importer), spec))
+    else:
+        prefix = next((alias for alias in aliases if spec.startswith(alias)), None)
+        if prefix is None:
+            return None
+        base = os.path.normpath(aliases[prefix] + spec[len(prefix):])
+    for candidate in [base, *(base + ext for ext in GRAPH_EXTENSIONS),
+                      *(f"{base}/index{ext}" for ext in GRAPH_EXTENSIONS)]:
+        if candidate in files:
+            return candidate
+    return None
+
+def build_import_graph(cache_file=GRAPH_CACHE_FILE):
+    """Import graph of the graph roots, reparsing only files whose blob changed"""
+    files = list_graph_files()
+    key = hashlib.sha256("\n".join(f"{sha} {path}" for path, sha in sorted(files.items())).encode()).hexdigest()
+    
+    try:
+        with open(cache_file) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    cached_files = cache.get("files", {})
+    
+    if cache.get("key") != key:
+        stale = {path: sha for path, sha in files.items()
+                 if cached_files.get(path, {}).get("sha") != sha}
+        blobs = read_blobs(sorted(set(stale.values())))
+        cached_files = {path: cached_files[path] for path in files if path not in stale}
+        for path, sha in stale.items():
+            specs = [next(group for group in match if group) for match in IMPORT_PATTERN.findall(blobs.get(sha, ""))]
+            cached_files[path] = {"sha": sha, "specs": sorted(set(specs))}
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp_file = f"{cache_file}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump({"key": key, "files": cached_files}, f)
+        os.replace(tmp_file, cache_file)
+        print(f"🕸️  Import graph updated: {len(stale)} of {len(files)} files reparsed")
+    
+    aliases = load_path_aliases()
+    graph = {}
+    for path, entry in cached_files.items():
+        resolved = (resolve_import(spec, path, files, aliases) for spec in entry["specs"])
+        graph[path] = sorted({dep for dep in resolved if dep and dep != path})
+    return graph
+
+def rank_by_impact(changes, graph):
+    """Order changes by blast radius (transitive importers), then direct fan-in and size"""
+    importers = {}
+    for path, deps in graph.items():
+        for dep in deps:
+            importers.setdefault(dep, []).append(path)
     
-    relevant_files = []
-    for file in files:
-        if any(file.endswith(ext) for ext in extensions):
-            if os.path.exists(file):
-                relevant_files.append(file)
+    for change in changes:
+        seen = set()
+        queue = deque([change["path"]])
+        while queue:
+            for importer in importers.get(queue.popleft(), []):
+                if importer not in seen:
+                    seen.add(importer)
+                    queue.append(importer)
+        change["fan_in"] = len(importers.get(change["path"], []))
+        change["blast_radius"] = len(seen)
     
-    return relevant_files
+    return sorted(changes, key=lambda c: (c["blast_radius"], c["fan_in"],
+                                          c["path"].endswith(GRAPH_EXTENSIONS), c["added"] + c["removed"]),
+                  reverse=True)
 
-def generate_diff_context(files, max_files=10):
+def generate_diff_context(changes, max_files=10, graph=None):
     """Generate focused context for AI analysis"""
-    if len(files) > max_files:
-        print(f"⚠️  Too many changed files ({len(files)}), limiting to {max_files} most important")
-        # Prioritize certain file types
-        priority_files = [f for f in files if any(f.endswith(ext) for ext in ['.ts', '.tsx', '.js', '.jsx'])]
-        files = priority_files[:max_files] if priority_files else files[:max_files]
+    if len(changes) > max_files:
+        print(f"⚠️  Too many changed files ({len(changes)}), limiting to {max_files} most important")
+        # Keep the changes the most other files depend on
+        changes = rank_by_impact(changes, graph if graph is not None else build_import_graph())[:max_files]
     
     context = {
-        "changed_files": files,
-        "file_count": len(files),
+        "changed_files": [change["path"] for change in changes],
+        "file_count": len(changes),
+        "changes": changes,
+        "lines_added": sum(change["added"] for change in changes),
+        "lines_removed": sum(change["removed"] for change in changes),
         "analysis_scope": "diff-only",
-        "timestamp": subprocess.run("date -u +%Y-%m-%dT%H:%M:%SZ", shell=True, capture_output=True, text=True).stdout.strip()
+        "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
     }
     
     return context
 
-def save_diff_context(context, output_file=".agent/wmacs_diff_context.json"):
+def unquote_git_path(path):
+    """Undo git's C-style quoting of unusual file names"""
+    if not path.startswith('"'):
+        return path
+    return path[1:-1].encode("latin-1", "backslashreplace").decode("unicode_escape").encode("latin-1").decode("utf-8", "surrogateescape")
+
+def parse_hunks(patch):
+    """Map each new-side path to its changed (start, end, lines_changed) ranges from a -U0 patch"""
+    hunks = {}
+    path = None
+    for line in patch.splitlines():
+        if line.startswith("diff --git "):
+            path = None
+        elif line.startswith("+++ "):
+            # git ends unquoted names containing spaces with a TAB
+            target = line[4:].rstrip("\t")
+            path = None if target == "/dev/null" else unquote_git_path(target)[2:]
+        elif path and line.startswith("@@"):
+            match = HUNK_HEADER.match(line)
+            if not match:
+                continue
+            start, count = int(match.group(1)), int(match.group(2) or 1)
+            # Pure deletions (count 0) are anchored on the line before the removed block
+            hunks.setdefault(path, []).append([max(start, 1), max(start + count - 1, start, 1), count])
+        elif path and line[:1] == "-" and hunks.get(path):
+            hunks[path][-1][2] += 1
+    return hunks
+
+def enclosing_range(lines, start, end):
+    """Widen a hunk to its enclosing top-level function/component, or to a few lines of context"""
+    decl = None
+    for index in range(min(start, len(lines)) - 1, -1, -1):
+        if DECLARATION_PATTERN.match(lines[index]):
+            decl = index + 1
+            break
+    if decl is not None:
+        block_end = len(lines)
+        for index in range(max(end, decl), len(lines)):
+            line = lines[index]
+            if line and not line[0].isspace() and line[0] not in "})]" and DECLARATION_PATTERN.match(line):
+                block_end = index
+                break
+        while block_end > end and not lines[block_end - 1].strip():
+            block_end -= 1
+        if block_end - decl < MAX_ENCLOSING_LINES:
+            symbol = DECLARATION_PATTERN.match(lines[decl - 1]).group(1)
+            return decl, max(block_end, end), symbol
+    return max(start - CONTEXT_LINES, 1), min(end + CONTEXT_LINES, max(len(lines), 1)), None
+
+def estimate_tokens(text):
+    return max(1, -(-len(text) // CHARS_PER_TOKEN))
+
+def knapsack(chunks, budget):
+    """Pick the chunk set with the highest total impact that fits the token budget"""
+    # Weights are rounded up to a unit so the table stays small for large budgets
+    unit = max(1, budget // 2000)
+    capacity = budget // unit
+    best = [0.0] * (capacity + 1)
+    keep = [[False] * (capacity + 1) for _ in chunks]
+    for i, chunk in enumerate(chunks):
+        weight = -(-chunk["tokens"] // unit)
+        for room in range(capacity, weight - 1, -1):
+            value = best[room - weight] + chunk["impact"]
+            if value > best[room]:
+                best[room] = value
+                keep[i][room] = True
+    chosen = []
+    room = capacity
+    for i in range(len(chunks) - 1, -1, -1):
+        if keep[i][room]:
+            chosen.append(chunks[i])
+            room -= -(-chunks[i]["tokens"] // unit)
+    return chosen[::-1]
+
+def pack_hunks(changes, diff_args, revision, token_budget):
+    """Pack changed hunks plus their enclosing functions into a token budget, by impact
+    `revision` names the new side for cat-file: "HEAD" for commits, "" for the index"""
+    patch = subprocess.run(["git", "diff", "-U0", "--no-color", "-M", "--src-prefix=a/", "--dst-prefix=b/", *diff_args],
+                           capture_output=True, encoding="utf-8", errors="surrogateescape").stdout
+    hunks = parse_hunks(patch)
+    changes = [change for change in changes if not change["binary"] and change["path"] in hunks]
+    if len(changes) > 1:
+        changes = rank_by_impact(changes, build_import_graph())
+    sources = read_blobs([f"{revision}:{change['path']}" for change in changes])
+    
+    chunks = []
+    for change in changes:
+        lines = sources.get(f"{revision}:{change['path']}", "").splitlines()
+        ranges = []
+        for start, end, changed in hunks[change["path"]]:
+            first, last, symbol = enclosing_range(lines, start, end)
+            if ranges and first <= ranges[-1]["end"] + 1:
+                # Overlapping hunks share one chunk
+                ranges[-1]["end"] = max(ranges[-1]["end"], last)
+                ranges[-1]["changed"] += changed
+                ranges[-1]["symbol"] = ranges[-1]["symbol"] or symbol
+            else:
+                ranges.append({"start": first, "end": last, "changed": changed, "symbol": symbol})
+        for chunk in ranges:
+            text = "\n".join(lines[chunk["start"] - 1:chunk["end"]])
+            chunks.append({
+                "path": change["path"],
+                "start": chunk["start"],
+                "end": chunk["end"],
+                "symbol": chunk["symbol"],
+                "tokens": estimate_tokens(f"{change['path']}:{chunk['start']}-{chunk['end']}\n{text}"),
+                "impact": (1 + change.get("blast_radius", 0)) * chunk["changed"],
+                "text": text
+            })
+    
+    packed = knapsack(chunks, token_budget)
+    packed.sort(key=lambda chunk: (chunk["path"], chunk["start"]))
+    packed_paths = {chunk["path"] for chunk in packed}
+    kept = [change for change in changes if change["path"] in packed_paths]
+    tokens_used = sum(chunk["tokens"] for chunk in packed)
+    print(f"📦 Packed {len(packed)} of {len(chunks)} chunks into {tokens_used}/{token_budget} tokens")
+    
+    return {
+        "changed_files": [change["path"] for change in kept],
+        "file_count": len(kept),
+        "changes": kept,
+        "chunks": packed,
+        "token_budget": token_budget,
+        "tokens_used": tokens_used,
+        "dropped_chunks": len(chunks) - len(packed),
+        "analysis_scope": "hunk-packed",
+        "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    }
+
+def save_diff_context(context, output_file=".agent/wmacs_diff_context.json", quiet=False):
     """Save diff context for AI consumption"""
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
     
     try:
-        with open(output_file, 'w') as f:
+        # Replace atomically so readers never see a half-written context
+        tmp_file = f"{output_file}.tmp"
+        with open(tmp_file, 'w') as f:
             json.dump(context, f, indent=2)
+        os.replace(tmp_file, output_file)
+        if quiet:
+            return
         print(f"✅ Diff context saved: {output_file}")
         print(f"📁 Files to analyze: {context['file_count']}")
-        for file in context['changed_files']:
-            print(f"   - {file}")
+        for change in context['changes']:
+            source = f" (from {change['old_path']})" if change['old_path'] else ""
+            print(f"   - {change['path']} [{change['status']}{source}] +{change['added']}/-{change['removed']}")
     except Exception as e:
         print(f"❌ Failed to save diff context: {e}")
 
+FOCUS_PROFILES_FILE = ".agent/wmacs_focus_profiles.json"
+DEFAULT_FOCUS_PROFILES = [
+    {
+        "name": "auth",
+        "analysis_focus": "authentication_imports",
+        # Same reach as the old substring checks ("middleware", "app/api/auth/", ...)
+        # wherever they sit in the tree, e.g. src/lib/auth-middleware.ts
+        "patterns": ["**/*app/api/auth/**", "**/*app/utils/auth*", "**/*app/utils/auth*/**",
+                     "**/*components/auth*", "**/*components/auth*/**", "**/pages/api/auth/**",
+                     "**/*pages/login*", "**/*pages/login*/**", "**/*pages/dashboard*", "**/*pages/dashboard*/**",
+                     "**/*middleware*", "**/*middleware*/**"],
+        "fallback": ["app/api/auth/login/route.ts", "app/api/auth/logout/route.ts", "app/api/auth/verify/route.ts",
+                     "app/utils/auth.ts", "middleware.ts"],
+        "output": ".agent/wmacs_auth_context.json",
+        "max_files": 15
+    },
+    {
+        "name": "prisma",
+        "analysis_focus": "database_schema",
+        "patterns": ["prisma/**", "**/*.prisma", "src/lib/prisma.ts"],
+        "output": ".agent/wmacs_prisma_context.json",
+        "max_files": 15
+    },
+    {
+        "name": "api-routes",
+        "analysis_focus": "api_routes",
+        "patterns": ["**/pages/api/**", "**/app/api/**"],
+        "output": ".agent/wmacs_api_context.json",
+        "max_files": 15
+    },
+    {
+        "name": "deployment",
+        "analysis_focus": "deployment_scripts",
+        "patterns": ["deployment/**", "mcp-blue-green/**", "scripts/mcp-*.py", "scripts/release_*.py",
+                     "**/*deploy*", "ecosystem.config*.js"],
+        "output": ".agent/wmacs_deployment_context.json",
+        "max_files": 15
+    }
+]
+
+class FocusMatcher:
+    """Path-segment trie over every profile's globs; one walk per path yields all matching profiles
+    Segments are literals, fnmatch wildcards, or ** for zero or more directories"""
+    
+    def __init__(self, profiles):
+        self.root = self.new_node()
+        for profile in profiles:
+            for pattern in profile["patterns"]:
+                self.insert(pattern, profile["name"])
+    
+    @staticmethod
+    def new_node(loop=False):
+        # A loop node is the state after **, which may consume any number of segments
+        return {"literal": {}, "wild": {}, "globstar": None, "loop": loop, "profiles": set()}
+    
+    def insert(self, pattern, name):
+        node = self.root
+        for segment in pattern.strip("/").split("/"):
+            if segment == "**":
+                node["globstar"] = node["globstar"] or self.new_node(loop=True)
+                node = node["globstar"]
+            elif any(char in segment for char in "*?["):
+                if segment not in node["wild"]:
+                    node["wild"][segment] = (re.compile(fnmatch.translate(segment)), self.new_node())
+                node = node["wild"][segment][1]
+            else:
+                node = node["literal"].setdefault(segment, self.new_node())
+        node["profiles"].add(name)
+    
+    @staticmethod
+    def closure(nodes):
+        """Add the states reachable by letting ** match nothing"""
+        expanded = list(nodes)
+        for node in expanded:
+            if node["globstar"] is not None and not any(node["globstar"] is seen for seen in expanded):
+                expanded.append(node["globstar"])
+        return expanded
+    
+    def match(self, path):
+        states = self.closure([self.root])
+        for segment in path.split("/"):
+            next_states = []
+            for node in states:
+                if segment in node["literal"]:
+                    next_states.append(node["literal"][segment])
+                for regex, child in node["wild"].values():
+                    if regex.match(segment):
+                        next_states.append(child)
+                if node["loop"]:
+                    next_states.append(node)
+            states = self.closure(next_states)
+            if not states:
+                return set()
+        matched = set()
+        for node in states:
+            matched |= node["profiles"]
+        return matched
+
+FOCUS_PROFILE_KEYS = ("name", "patterns", "output")
+
+def load_focus_profiles(config_file=FOCUS_PROFILES_FILE):
+    """Focus profiles from the config file, else the built-in defaults
+    Raises ValueError naming the problem when the file is malformed"""
+    try:
+        with open(config_file) as f:
+            profiles = json.load(f)["profiles"]
+    except FileNotFoundError:
+        return DEFAULT_FOCUS_PROFILES
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"{config_file}: expected a JSON object with a \"profiles\" list ({e})")
+    if not isinstance(profiles, list):
+        raise ValueError(f"{config_file}: \"profiles\" must be a list")
+    for position, profile in enumerate(profiles):
+        if not isinstance(profile, dict):
+            raise ValueError(f"{config_file}: profile #{position + 1} is not an object")
+        missing = [key for key in FOCUS_PROFILE_KEYS if not profile.get(key)]
+        if missing:
+            raise ValueError(f"{config_file}: profile #{position + 1} is missing {', '.join(missing)}")
+        if not isinstance(profile["patterns"], list) or not all(isinstance(p, str) for p in profile["patterns"]):
+            raise ValueError(f"{config_file}: profile {profile['name']} patterns must be a list of globs")
+    return profiles
+
+def generate_focus_contexts(changes, profiles):
+    """Sort every change into all matching profiles in a single pass and build each profile's context"""
+    matcher = FocusMatcher(profiles)
+    matched = {profile["name"]: [] for profile in profiles}
+    for change in changes:
+        if change["status"] == "deleted":
+            continue
+        for name in matcher.match(change["path"]):
+            matched[name].append(change)
+    
+    graph = None
+    contexts = {}
+    for profile in profiles:
+        focus_changes = matched[profile["name"]]
+        if not focus_changes and profile.get("fallback"):
+            print(f"No {profile['name']} files found in diff, using its fallback files")
+            focus_changes = [{"path": f, "status": "unchanged", "old_path": None, "added": 0, "removed": 0, "binary": False}
+                             for f in profile["fallback"] if os.path.exists(f)]
+        max_files = profile.get("max_files", 10)
+        if len(focus_changes) > max_files and graph is None:
+            graph = build_import_graph()
+        context = generate_diff_context(focus_changes, max_files=max_files, graph=graph)
+        context["analysis_focus"] = profile.get("analysis_focus", profile["name"])
+        contexts[profile["name"]] = context
+    return contexts
+
+WATCH_IGNORED_DIRS = {".git", "node_modules", ".next", ".agent", "__pycache__", ".venv", "venv"}
+GIT_STATE_FILES = {".git/index", ".git/HEAD"}
+
+class InotifyWatcher:
+    """Recursive file watcher on Linux inotify via ctypes"""
+    IN_MODIFY = 0x002
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_ISDIR = 0x40000000
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    
+    def __init__(self, root="."):
+        import ctypes
+        import ctypes.util
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs = {}
+        for dirpath, dirnames, _ in os.walk(root):
+            dirnames[:] = [d for d in dirnames if d not in WATCH_IGNORED_DIRS]
+            self.add_dir(os.path.relpath(dirpath, root))
+        # Index and HEAD are replaced by rename, so watch the .git directory itself
+        self.add_dir(".git")
+    
+    def add_dir(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.MASK)
+        if wd >= 0:
+            self.dirs[wd] = path
+    
+    def wait(self, timeout):
+        """Relative paths touched within the timeout"""
+        import select
+        import struct
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        data = os.read(self.fd, 64 * 1024)
+        paths = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = struct.unpack_from("iIII", data, offset)
+            name = data[offset + 16:offset + 16 + length].rstrip(b"\0").decode(errors="replace")
+            offset += 16 + length
+            path = os.path.normpath(os.path.join(self.dirs.get(wd, "."), name))
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO) and name not in WATCH_IGNORED_DIRS:
+                    self.add_dir(path)
+                continue
+            paths.add(path)
+        return paths
+
+class PollingWatcher:
+    """Fallback watcher comparing file mtimes where inotify is unavailable"""
+    
+    def __init__(self, root=".", interval=1.0):
+        self.root = root
+        self.interval = interval
+        self.snapshot = self.scan()
+    
+    def scan(self):
+        stats = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if d not in WATCH_IGNORED_DIRS]
+            for filename in filenames:
+                path = os.path.normpath(os.path.join(dirpath, filename))
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                stats[path] = (stat.st_mtime_ns, stat.st_size)
+        for path in GIT_STATE_FILES:
+            try:
+                stat = os.stat(path)
+                stats[path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                pass
+        return stats
+    
+    def wait(self, timeout):
+        time.sleep(max(timeout, self.interval))
+        current = self.scan()
+        changed = {path for path, stat in current.items() if self.snapshot.get(path) != stat}
+        changed |= set(self.snapshot) - set(current)
+        self.snapshot = current
+        return changed
+
+def create_watcher():
+    try:
+        watcher = InotifyWatcher()
+        print(f"👀 Watching {len(watcher.dirs)} directories with inotify")
+    except (OSError, AttributeError, TypeError):
+        watcher = PollingWatcher()
+        print("👀 inotify unavailable, polling for changes")
+    return watcher
+
+def watch_diff(base_branch="main", output_file=".agent/wmacs_diff_context.json", debounce=0.3, max_delay=2.0):
+    """Keep the diff context current: re-diff only touched paths, rewrite the context debounced"""
+    # Working tree against the base, so uncommitted edits are included
+    state = {change["path"]: change for change in run_git_diff([base_branch])}
+    graph = build_import_graph()
+    
+    def write_context():
+        context = generate_diff_context(filter_relevant_files(list(state.values())), graph=graph)
+        context["analysis_scope"] = "diff-watch"
+        save_diff_context(context, output_file, quiet=True)
+        return context
+    
+    context = write_context()
+    print(f"✅ Diff context saved: {output_file} ({context['file_count']} files)")
+    watcher = create_watcher()
+    
+    pending = set()
+    first_event = None
+    while True:
+        touched = watcher.wait(debounce)
+        if touched:
+            pending |= touched
+            first_event = first_event or time.monotonic()
+            # Keep collecting while edits are still arriving, up to max_delay
+            if time.monotonic() - first_event < max_delay:
+                continue
+        if not pending:
+            continue
+        
+        start = time.monotonic()
+        if pending & GIT_STATE_FILES or len(pending) > 500:
+            # Staging, commits and checkouts can change any entry; one full diff covers them
+            state = {change["path"]: change for change in run_git_diff([base_branch])}
+            graph = build_import_graph()
+        else:
+            paths = sorted(path for path in pending if not path.startswith(".git/"))
+            if paths:
+                for path in paths:
+                    state.pop(path, None)
+                for change in run_git_diff([base_branch, "--", *paths]):
+                    state[change["path"]] = change
+        context = write_context()
+        print(f"🔄 Context updated in {(time.monotonic() - start) * 1000:.0f}ms "
+              f"({len(pending)} paths touched, {context['file_count']} files in context)")
+        pending = set()
+        first_event = None
+
 def main():
+    # Non-UTF-8 file names are carried as surrogate escapes; print them escaped
+    sys.stdout.reconfigure(errors="backslashreplace")
     if len(sys.argv) < 2:
         print("Usage: python wmacs-diff-analyzer.py <command> [args]")
         print("Commands:")
         print("  analyze [base_branch] - Analyze changed files vs base branch")
         print("  staged - Analyze staged files only")
+        print("  (analyze and staged accept --token-budget=N to pack changed hunks into N tokens)")
         print("  auth-fix - Focus on authentication-related files")
+        print("  focus [profile ...] - Write a context file per focus profile (all profiles by default)")
+        print("                        --base=<branch>, --profiles=<config.json>")
+        print("  watch [base_branch] - Keep the diff context up to date as files change")
         sys.exit(1)
     
-    command = sys.argv[1]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    token_budget = next((int(arg.split("=", 1)[1]) for arg in sys.argv if arg.startswith("--token-budget=")), None)
+    command = args[0]
     
     if command == "analyze":
-        base_branch = sys.argv[2] if len(sys.argv) > 2 else "main"
-        files = get_git_diff_files(base_branch)
-        relevant_files = filter_relevant_files(files)
-        context = generate_diff_context(relevant_files)
+        base_branch = args[1] if len(args) > 1 else "main"
+        changes = get_git_diff_files(base_branch)
+        relevant_changes = filter_relevant_files(changes)
+        if token_budget:
+            context = pack_hunks(relevant_changes, [f"{base_branch}..HEAD"], "HEAD", token_budget)
+        else:
+            context = generate_diff_context(relevant_changes)
         save_diff_context(context)
     
     elif command == "staged":
-        files = get_staged_files()
-        relevant_files = filter_relevant_files(files)
-        context = generate_diff_context(relevant_files)
+        changes = get_staged_files()
+        relevant_changes = filter_relevant_files(changes)
+        if token_budget:
+            context = pack_hunks(relevant_changes, ["--cached"], "", token_budget)
+        else:
+            context = generate_diff_context(relevant_changes)
         save_diff_context(context)
     
-    elif command == "auth-fix":
-        # Focus specifically on authentication-related files
-        auth_patterns = [
-            "app/api/auth/",
-            "app/utils/auth",
-            "middleware",
-            "components/auth",
-            "pages/login",
-            "pages/dashboard"
-        ]
-        
-        all_files = get_git_diff_files("main")
-        auth_files = [f for f in all_files if any(pattern in f for pattern in auth_patterns)]
+    elif command in ("focus", "auth-fix"):
+        base_branch = next((arg.split("=", 1)[1] for arg in sys.argv if arg.startswith("--base=")), "main")
+        config_file = next((arg.split("=", 1)[1] for arg in sys.argv if arg.startswith("--profiles=")), FOCUS_PROFILES_FILE)
+        try:
+            profiles = load_focus_profiles(config_file)
+        except ValueError as e:
+            print(f"❌ Invalid focus profiles: {e}")
+            sys.exit(1)
+        # auth-fix is the auth profile on its own
+        selected = ["auth"] if command == "auth-fix" else args[1:]
+        if selected:
+            unknown = set(selected) - {profile["name"] for profile in profiles}
+            if unknown:
+                print(f"Unknown focus profile(s): {', '.join(sorted(unknown))}")
+                sys.exit(1)
+            profiles = [profile for profile in profiles if profile["name"] in selected]
         
-        if not auth_files:
-            print("No authentication-related files found in diff")
-            # Fallback to known auth files that might need fixing
-            potential_auth_files = [
-                "app/api/auth/login/route.ts",
-                "app/api/auth/logout/route.ts", 
-                "app/api/auth/verify/route.ts",
-                "app/utils/auth.ts",
-                "middleware.ts"
-            ]
-            auth_files = [f for f in potential_auth_files if os.path.exists(f)]
-        
-        context = generate_diff_context(auth_files, max_files=15)
-        context["analysis_focus"] = "authentication_imports"
-        save_diff_context(context, ".agent/wmacs_auth_context.json")
+        contexts = generate_focus_contexts(get_git_diff_files(base_branch), profiles)
+        for profile in profiles:
+            save_diff_context(contexts[profile["name"]], profile["output"])
+    
+    elif command == "watch":
+        base_branch = args[1] if len(args) > 1 else "main"
+        try:
+            watch_diff(base_branch)
+        except KeyboardInterrupt:
+            print("👋 Stopped watching")
     
     else:
         print(f"Unknown command: {command}")
@@ -0,0 +1,26 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "scripts")
+sys.path.insert(0, os.path.abspath(SCRIPTS_DIR))
+
+def load_script(filename, module_name):
+    """Import a script whose file name is not a valid module name (e.g. wmacs-diff-analyzer.py)"""
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(SCRIPTS_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+@pytest.fixture
+def ledger_env(tmp_path, monkeypatch):
+    """Run the token ledger against an empty .agent directory with a fixed branch and commit"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("WMACS_BRANCH", "main")
+    monkeypatch.setenv("WMACS_COMMIT_SHA", "abc12345")
+    return tmp_path
@@ -0,0 +1,22 @@
+import pytest
+
+from fleet import is_fleet, parse_targets
+
+def test_single_target_may_fall_back_to_app_url(monkeypatch):
+    monkeypatch.delenv("MCP_FLEET_APP_URL", raising=False)
+    assert parse_targets("132") == [("132", None)]
+    assert not is_fleet("132")
+
+def test_fleet_fills_urls_from_template(monkeypatch):
+    monkeypatch.setenv("MCP_FLEET_APP_URL", "http://10.92.3.{container_id}:3001")
+    assert parse_targets("132=http://app-a:3001, 134") == [
+        ("132", "http://app-a:3001"),
+        ("134", "http://10.92.3.134:3001")
+    ]
+
+def test_fleet_needs_a_url_per_node(monkeypatch):
+    monkeypatch.delenv("MCP_FLEET_APP_URL", raising=False)
+    with pytest.raises(ValueError, match="134"):
+        parse_targets("132=http://app-a:3001,134")
+    with pytest.raises(ValueError, match="its own app URL"):
+        parse_targets("132=http://app:3001,134=http://app:3001")
@@ -0,0 +1,30 @@
+import pytest
+
+from health_probe import configured_app_url, configured_health_urls, percentile
+
+@pytest.mark.parametrize("pct, expected", [(0, 1), (50, 5), (90, 9), (95, 10), (100, 10)])
+def test_percentile_is_nearest_rank(pct, expected):
+    assert percentile([10, 9, 8, 7, 6, 5, 4, 3, 2, 1], pct) == expected
+
+def test_percentile_of_nothing_is_zero():
+    assert percentile([], 95) == 0.0
+
+def test_percentile_single_value():
+    assert percentile([0.25], 50) == 0.25
+
+def test_app_url_has_no_localhost_default(monkeypatch):
+    monkeypatch.delenv("MCP_APP_URL", raising=False)
+    with pytest.raises(ValueError, match="MCP_APP_URL"):
+        configured_app_url()
+
+def test_app_url_prefers_explicit_url(monkeypatch):
+    monkeypatch.setenv("MCP_APP_URL", "http://10.92.3.132:3001/")
+    assert configured_app_url() == "http://10.92.3.132:3001"
+    assert configured_app_url("http://10.92.3.134:3001") == "http://10.92.3.134:3001"
+
+def test_health_urls_retarget_configured_paths(monkeypatch):
+    monkeypatch.setenv("MCP_HEALTH_URLS", "http://app.local/api/health, http://app.local/login")
+    assert configured_health_urls("http://10.92.3.134:3001") == [
+        "http://10.92.3.134:3001/api/health",
+        "http://10.92.3.134:3001/login"
+    ]
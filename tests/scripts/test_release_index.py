@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from release_index import ReleaseIndex, seed_from_container
+
+@pytest.fixture
+def index(tmp_path):
+    return ReleaseIndex("theoshift", "132", root=str(tmp_path))
+
+def deploy(index, sha, deployed_at, health=None):
+    index.record_release(sha)
+    index.data["releases"][sha]["deployed_at"] = deployed_at
+    index.mark_current(sha)
+    if health is not None:
+        index.record_health(sha, health == "healthy")
+
+def test_current_and_previous_survive_reload(index, tmp_path):
+    deploy(index, "aaa", 1)
+    deploy(index, "bbb", 2)
+    reloaded = ReleaseIndex("theoshift", "132", root=str(tmp_path))
+    assert (reloaded.current, reloaded.previous) == ("bbb", "aaa")
+
+def test_rollback_target_is_previous_unless_known_bad(index):
+    deploy(index, "aaa", 1, "healthy")
+    deploy(index, "bbb", 2, "healthy")
+    deploy(index, "ccc", 3)
+    assert index.rollback_target() == "bbb"
+
+    index.record_health("bbb", False)
+    # The previous release failed its checks, so fall back to the last one that passed
+    assert index.rollback_target() == "aaa"
+
+def test_rollback_target_without_history(index):
+    deploy(index, "aaa", 1)
+    assert index.rollback_target() is None
+
+def test_prune_keeps_current_previous_and_last_known_good(index):
+    deploy(index, "good", 1, "healthy")
+    for position, sha in enumerate(["r2", "r3", "r4", "r5", "r6"], start=2):
+        deploy(index, sha, position, "unhealthy")
+    deploy(index, "prev", 7)
+    deploy(index, "cur", 8)
+
+    removed = index.prune(keep_count=1)
+    assert sorted(removed) == ["r2", "r3", "r4", "r5", "r6"]
+    assert {release["sha"] for release in index.releases()} == {"cur", "prev", "good"}
+    assert index.prune(keep_count=1) == []
+
+def test_seed_sets_current_and_next_newest_as_previous(index):
+    index.seed({"old": 100.0, "mid": 200.0, "new": 300.0}, current="mid")
+    assert (index.current, index.previous) == ("mid", "new")
+    assert index.get("old")["health"] == "unknown"
+
+def test_seed_from_container_only_fills_an_empty_index(index):
+    async def run_remote(command):
+        if command.startswith("cd "):
+            return "100 aaa\n200 bbb\nnot-a-line\n"
+        return "/opt/theoshift/releases/bbb\n"
+
+    assert asyncio.run(seed_from_container(index, run_remote, "theoshift")) is True
+    assert (index.current, index.previous) == ("bbb", "aaa")
+    assert asyncio.run(seed_from_container(index, run_remote, "theoshift")) is False
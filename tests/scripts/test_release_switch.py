@@ -0,0 +1,46 @@
+import pytest
+
+from release_index import ReleaseIndex
+from release_switch import ReleaseSwitcher, configured_front_url, with_port
+
+async def run_remote(command):
+    return ""
+
+@pytest.fixture
+def index(tmp_path):
+    return ReleaseIndex("theoshift", "132", root=str(tmp_path))
+
+@pytest.fixture(autouse=True)
+def clean_env(monkeypatch):
+    for name in ("MCP_RESTART_MODE", "MCP_HEALTH_URLS", "MCP_FRONT_URL", "MCP_APP_URL"):
+        monkeypatch.delenv(name, raising=False)
+
+def switcher(index, **kwargs):
+    return ReleaseSwitcher("theoshift", run_remote, index, app_url="http://10.92.3.132:3001", **kwargs)
+
+def test_front_url_template(monkeypatch):
+    assert configured_front_url("132") is None
+    monkeypatch.setenv("MCP_FRONT_URL", "http://10.92.3.{container_id}/")
+    assert configured_front_url("132") == "http://10.92.3.132"
+
+def test_with_port():
+    assert with_port("http://10.92.3.132:3001/api/health", 3002) == "http://10.92.3.132:3002/api/health"
+
+def test_zero_downtime_needs_a_front_door(index):
+    with pytest.raises(ValueError, match="MCP_FRONT_URL"):
+        switcher(index, mode="zero-downtime")
+    with pytest.raises(ValueError, match="app port"):
+        switcher(index, mode="zero-downtime", front_url="http://10.92.3.132:3001")
+
+def test_zero_downtime_probes_go_through_nginx(index):
+    index.set_active_port(3002)
+    zero = switcher(index, mode="zero-downtime", front_url="http://10.92.3.132")
+    assert zero.probe_url() == "http://10.92.3.132"
+    assert "http://10.92.3.132/api/health" in zero.health_urls()
+    assert all(url.startswith(("http://10.92.3.132/", "http://10.92.3.132:3002/")) for url in zero.health_urls())
+
+def test_restart_mode_cannot_take_over_zero_downtime(index):
+    index.set_restart_mode("zero-downtime")
+    assert switcher(index, front_url="http://10.92.3.132").mode == "zero-downtime"
+    with pytest.raises(ValueError, match="zero-downtime"):
+        switcher(index, mode="restart")
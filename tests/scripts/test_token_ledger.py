@@ -0,0 +1,132 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+import token_ledger
+
+def write_entries(entries):
+    """Append hand-built entries, bypassing build_entry's timestamps"""
+    token_ledger.ensure_ledger_dir()
+    token_ledger.append_lines("".join(json.dumps(entry) + "\n" for entry in entries).encode("utf-8"))
+
+def entry(phase, tokens, timestamp, branch="main"):
+    return {
+        "timestamp": timestamp.isoformat(),
+        "phase": phase,
+        "operation": "",
+        "branch": branch,
+        "commit_sha": "abc12345",
+        "prompt_tokens": tokens,
+        "completion_tokens": 0,
+        "total_tokens": tokens,
+        "estimated_credits": tokens / 1000.0
+    }
+
+def test_writer_round_trips_through_index_and_rollup(ledger_env):
+    with token_ledger.LedgerWriter() as ledger:
+        ledger.log("deploy", 100, 20, "snapshot")
+        ledger.log("deploy", 50, 10, "migrate")
+        ledger.log("build", 7, 3)
+
+    usage = token_ledger.get_phase_usage("deploy", "main")
+    assert usage["operations"] == 2
+    assert usage["total_tokens"] == 180
+    assert [e["operation"] for e in usage["entries"]] == ["snapshot", "migrate"]
+
+    totals = token_ledger.get_phase_usage("deploy", include_entries=False)
+    assert totals == {"total_tokens": 180, "total_credits": 0.18, "operations": 2}
+
+    # Entries appended after the index was saved are picked up incrementally
+    token_ledger.log_token_usage("deploy", 1, 1)
+    index = token_ledger.load_index()
+    assert len(index["phase_branch"]["deploy\tmain"]) == 3
+    assert len(index["timestamps"]["deploy\tmain"]) == 3
+    assert token_ledger.get_phase_usage("deploy", include_entries=False)["operations"] == 3
+
+def test_compaction_keeps_totals_and_report(ledger_env):
+    now = datetime.utcnow()
+    old = now - timedelta(days=90)
+    write_entries([entry("deploy", 100, old), entry("deploy", 200, old), entry("deploy", 40, now)])
+    before = token_ledger.get_phase_usage("deploy", include_entries=False)
+
+    archived = token_ledger.compact_ledger(retention_days=30)
+    assert archived == {old.strftime("%Y-%m"): 2}
+
+    assert token_ledger.get_phase_usage("deploy", include_entries=False) == before
+    usage = token_ledger.get_phase_usage("deploy")
+    assert usage["total_tokens"] == 340
+    assert usage["operations"] == 3
+    assert len(usage["entries"]) == 1
+
+    report = token_ledger.build_report("deploy")
+    assert report["operations"] == 3
+    assert report["total_tokens"] == 340
+    hot = token_ledger.build_report("deploy", include_archived=False)
+    assert hot["operations"] == 1
+
+    # A second pass merges into the existing segment rather than replacing it
+    write_entries([entry("deploy", 5, old)])
+    token_ledger.compact_ledger(retention_days=30)
+    assert token_ledger.build_report("deploy")["operations"] == 4
+    assert token_ledger.get_phase_usage("deploy", include_entries=False)["total_tokens"] == 345
+
+def test_window_usage_uses_entry_timestamps_not_append_order(ledger_env):
+    now = datetime.utcnow()
+    # A batch stamped earlier can land after newer entries
+    write_entries([
+        entry("test", 10, now - timedelta(minutes=5)),
+        entry("test", 1000, now - timedelta(hours=3)),
+        entry("test", 20, now - timedelta(minutes=1)),
+        entry("build", 500, now)
+    ])
+    usage = token_ledger.get_window_usage("test", since=now - timedelta(hours=1))
+    assert usage == {"total_tokens": 30, "total_credits": 0.03, "operations": 2}
+    assert token_ledger.get_window_usage("test")["operations"] == 3
+
+def test_window_usage_without_ledger(ledger_env):
+    assert token_ledger.get_window_usage("test", since=datetime.utcnow()) == \
+        {"total_tokens": 0, "total_credits": 0.0, "operations": 0}
+
+def test_ledger_lock_excludes_other_threads(ledger_env):
+    events = []
+    entered = threading.Event()
+
+    def hold():
+        with token_ledger.ledger_lock():
+            # Nested blocks in the same thread must not deadlock
+            with token_ledger.ledger_lock():
+                events.append("A in")
+                entered.set()
+                time.sleep(0.2)
+            events.append("A out")
+
+    def wait():
+        entered.wait()
+        with token_ledger.ledger_lock():
+            events.append("B in")
+
+    threads = [threading.Thread(target=hold), threading.Thread(target=wait)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert events == ["A in", "A out", "B in"]
+
+def test_forced_legacy_import_merges(ledger_env):
+    now = datetime.utcnow()
+    legacy = [entry("build", 10, now - timedelta(days=2)), entry("build", 20, now - timedelta(days=1))]
+    token_ledger.ensure_ledger_dir()
+    with open(token_ledger.LEGACY_LEDGER_FILE, "w") as f:
+        json.dump(legacy, f)
+
+    assert token_ledger.import_legacy_ledger() == 2
+    write_entries([entry("build", 30, now)])
+
+    # Only the legacy entry the log does not have yet is appended
+    legacy.append(entry("build", 40, now))
+    with open(token_ledger.LEGACY_LEDGER_FILE, "w") as f:
+        json.dump(legacy, f)
+    assert token_ledger.import_legacy_ledger(force=True) == 1
+    assert token_ledger.import_legacy_ledger(force=True) == 0
+    assert token_ledger.get_phase_usage("build", include_entries=False)["total_tokens"] == 100
@@ -0,0 +1,141 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from conftest import load_script
+
+analyzer = load_script("wmacs-diff-analyzer.py", "wmacs_diff_analyzer")
+
+def test_parse_diff_output_pairs_raw_and_numstat_records():
+    output = "\0".join([
+        ":100644 100644 1111111 2222222 M", "src/app.ts",
+        ":100644 100644 3333333 4444444 R087", "old name.ts", "src/new name.ts",
+        ":000000 100644 0000000 5555555 A", "public/logo.png",
+        "4\t1\tsrc/app.ts",
+        "2\t3\t", "old name.ts", "src/new name.ts",
+        "-\t-\tpublic/logo.png",
+        ""
+    ])
+    changes = analyzer.parse_diff_output(output)
+    assert [change["path"] for change in changes] == ["src/app.ts", "src/new name.ts", "public/logo.png"]
+    modified, renamed, binary = changes
+    assert (modified["status"], modified["added"], modified["removed"]) == ("modified", 4, 1)
+    assert renamed["status"] == "renamed"
+    assert renamed["old_path"] == "old name.ts"
+    assert (renamed["added"], renamed["removed"]) == (2, 3)
+    assert binary["binary"] is True
+    assert (binary["added"], binary["removed"]) == (0, 0)
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_run_git_diff_keeps_non_utf8_paths(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    git = ["git", "-c", "user.name=t", "-c", "user.email=t@example.com"]
+    subprocess.run(git + ["init", "-q"], check=True)
+    name = os.fsdecode(b"caf\xe9.ts")
+    with open(name, "w") as f:
+        f.write("one\n")
+    with open("renamed.ts", "w") as f:
+        f.write("a\nb\nc\nd\n")
+    subprocess.run(git + ["add", "-A"], check=True)
+    subprocess.run(git + ["commit", "-qm", "base"], check=True)
+    with open(name, "a") as f:
+        f.write("two\n")
+    subprocess.run(git + ["mv", "renamed.ts", "moved.ts"], check=True)
+    subprocess.run(git + ["add", "-A"], check=True)
+
+    changes = {change["path"]: change for change in analyzer.run_git_diff(["--cached"])}
+    assert changes[name]["added"] == 1
+    assert changes["moved.ts"]["status"] == "renamed"
+    assert changes["moved.ts"]["old_path"] == "renamed.ts"
+
+def test_parse_hunks_handles_tab_suffixed_and_quoted_paths():
+    patch = "\n".join([
+        "diff --git a/src/my file.ts b/src/my file.ts",
+        "--- a/src/my file.ts\t",
+        "+++ b/src/my file.ts\t",
+        "@@ -10,2 +10,3 @@ function x() {",
+        "-old",
+        "-old",
+        "+new",
+        "+new",
+        "+new",
+        'diff --git "a/caf\\303\\251.ts" "b/caf\\303\\251.ts"',
+        '--- "a/caf\\303\\251.ts"',
+        '+++ "b/caf\\303\\251.ts"',
+        "@@ -4 +4 @@",
+        "-x",
+        "+y",
+        "diff --git a/gone.ts b/gone.ts",
+        "--- a/gone.ts",
+        "+++ /dev/null",
+        "@@ -1,5 +0,0 @@",
+        "-deleted",
+    ])
+    hunks = analyzer.parse_hunks(patch)
+    assert hunks == {
+        "src/my file.ts": [[10, 12, 5]],
+        "café.ts": [[4, 4, 2]]
+    }
+
+def test_parse_hunks_anchors_pure_deletions():
+    patch = "\n".join(["+++ b/a.ts", "@@ -8,2 +7,0 @@", "-one", "-two"])
+    assert analyzer.parse_hunks(patch) == {"a.ts": [[7, 7, 2]]}
+
+def test_knapsack_maximises_impact_within_budget():
+    chunks = [
+        {"id": "a", "tokens": 60, "impact": 10.0},
+        {"id": "b", "tokens": 50, "impact": 7.0},
+        {"id": "c", "tokens": 50, "impact": 7.0},
+        {"id": "d", "tokens": 200, "impact": 100.0}
+    ]
+    # Greedy by impact would take a alone; b + c is worth more
+    assert [chunk["id"] for chunk in analyzer.knapsack(chunks, 100)] == ["b", "c"]
+    assert analyzer.knapsack(chunks, 10) == []
+
+def test_knapsack_rounds_weights_for_large_budgets():
+    chunks = [{"id": i, "tokens": 3000, "impact": 1.0} for i in range(5)]
+    chosen = analyzer.knapsack(chunks, 10000)
+    assert sum(chunk["tokens"] for chunk in chosen) <= 10000
+    assert len(chosen) == 3
+
+@pytest.mark.parametrize("path, expected", [
+    ("src/lib/auth-middleware.ts", {"auth"}),
+    ("middleware.ts", {"auth"}),
+    ("src/app/api/auth/login/route.ts", {"auth", "api-routes"}),
+    ("app/api/users/route.ts", {"api-routes"}),
+    ("pages/api/auth/verify.ts", {"auth", "api-routes"}),
+    ("src/pages/login.tsx", {"auth"}),
+    ("prisma/schema.prisma", {"prisma"}),
+    ("db/extra.prisma", {"prisma"}),
+    ("scripts/mcp-deploy.py", {"deployment"}),
+    ("src/components/Button.tsx", set()),
+])
+def test_focus_matcher_default_profiles(path, expected):
+    matcher = analyzer.FocusMatcher(analyzer.DEFAULT_FOCUS_PROFILES)
+    assert matcher.match(path) == expected
+
+def test_focus_matcher_globstar_matches_zero_or_more_directories():
+    matcher = analyzer.FocusMatcher([{"name": "docs", "patterns": ["docs/**/*.md"]}])
+    assert matcher.match("docs/index.md") == {"docs"}
+    assert matcher.match("docs/a/b/c.md") == {"docs"}
+    assert matcher.match("docs/a/b/c.txt") == set()
+    assert matcher.match("src/docs/index.md") == set()
+
+def test_load_focus_profiles_defaults_when_missing(tmp_path):
+    assert analyzer.load_focus_profiles(str(tmp_path / "missing.json")) is analyzer.DEFAULT_FOCUS_PROFILES
+
+@pytest.mark.parametrize("config, message", [
+    ("not json", "expected a JSON object"),
+    ({"profiles": {"name": "auth"}}, "must be a list"),
+    ({"profiles": ["auth"]}, "is not an object"),
+    ({"profiles": [{"name": "auth", "patterns": ["**/auth/**"]}]}, "missing output"),
+    ({"profiles": [{"name": "auth", "patterns": "**/auth/**", "output": "x.json"}]}, "list of globs"),
+])
+def test_load_focus_profiles_rejects_malformed_configs(tmp_path, config, message):
+    config_file = tmp_path / "profiles.json"
+    config_file.write_text(config if isinstance(config, str) else json.dumps(config))
+    with pytest.raises(ValueError, match=message):
+        analyzer.load_focus_profiles(str(config_file))